@@ -18,6 +18,13 @@ db = SQLAlchemy(model_class=Base)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET")
 
+# JSON responses (status polling, token info) don't need sorted keys; skip the sort
+app.json.sort_keys = False
+
+# Let a fronting server (Apache mod_xsendfile, lighttpd) send report files itself
+# when it is configured for it; the worker then only emits the X-Sendfile header
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE", "").lower() in ("1", "true", "yes")
+
 # configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
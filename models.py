@@ -1,5 +1,6 @@
 from app import db
 from datetime import datetime
+import time
 
 class SesameToken(db.Model):
     """Model to store Sesame API token configuration"""
@@ -13,6 +14,10 @@ class SesameToken(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Process-wide memo of has_active_token(): (expires_at, result)
+    _has_active_cache = None
+    _HAS_ACTIVE_TTL_SECONDS = 30
+    
     def __repr__(self):
         return f'<SesameToken {self.id}>'
     
@@ -21,6 +26,21 @@ class SesameToken(db.Model):
         """Get the currently active token"""
         return cls.query.filter_by(is_active=True).first()
     
+    @classmethod
+    def has_active_token(cls):
+        """Whether a token is configured, cached briefly to spare page loads a query"""
+        cached = cls._has_active_cache
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        result = db.session.query(cls.query.filter_by(is_active=True).exists()).scalar()
+        cls._has_active_cache = (time.monotonic() + cls._HAS_ACTIVE_TTL_SECONDS, result)
+        return result
+    
+    @classmethod
+    def invalidate_active_token_cache(cls):
+        """Forget the cached has_active_token() result (call after changing tokens)"""
+        cls._has_active_cache = None
+    
     @classmethod
     def set_active_token(cls, token, description=None, region='eu1'):
         """Set a new active token, deactivating all others"""
@@ -31,6 +51,7 @@ class SesameToken(db.Model):
         new_token = cls(token=token, description=description, region=region, is_active=True)
         db.session.add(new_token)
         db.session.commit()
+        cls.invalidate_active_token_cache()
         
         return new_token
     
@@ -39,6 +60,7 @@ class SesameToken(db.Model):
         """Remove all tokens from the database"""
         cls.query.delete()
         db.session.commit()
+        cls.invalidate_active_token_cache()
 
 
 class CheckType(db.Model):
@@ -54,6 +76,11 @@ class CheckType(db.Model):
     def __repr__(self):
         return f'<CheckType {self.id}: {self.name}>'
     
+    @classmethod
+    def has_any(cls):
+        """Whether any check type is cached (EXISTS, stops at the first row)"""
+        return db.session.query(cls.query.exists()).scalar()
+    
     @classmethod
     def get_by_id(cls, check_type_id):
         """Get check type by ID"""
@@ -65,6 +92,13 @@ class CheckType(db.Model):
         check_type = cls.query.get(check_type_id)
         return check_type.name if check_type else "Actividad desconocida"
     
+    @classmethod
+    def get_names_by_ids(cls, check_type_ids):
+        """Map check type IDs to names with a single query (unknown IDs are left out)"""
+        if not check_type_ids:
+            return {}
+        return dict(db.session.query(cls.id, cls.name).filter(cls.id.in_(list(check_type_ids))).all())
+    
     @classmethod
     def bulk_upsert(cls, check_types_data):
         """Bulk insert or update check types"""
@@ -84,4 +118,21 @@ class CheckType(db.Model):
                 )
                 db.session.add(check_type)
         
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+    
+    @classmethod
+    def replace_all(cls, check_types_data):
+        """Replace every check type with the given ones in a single transaction"""
+        # Later duplicates win, as they would with bulk_upsert
+        rows = {
+            data['id']: {'id': data['id'], 'name': data['name'], 'description': data.get('description', '')}
+            for data in check_types_data
+        }
+        try:
+            cls.query.delete(synchronize_session=False)
+            if rows:
+                db.session.execute(cls.__table__.insert(), list(rows.values()))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
\ No newline at end of file
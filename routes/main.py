@@ -1,13 +1,25 @@
-from flask import Blueprint, render_template, request, jsonify, send_file, flash, redirect, url_for, session
-from datetime import datetime, timedelta
+from flask import Blueprint, render_template, request, jsonify, send_file, flash, redirect, url_for, session, Response, current_app
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import atexit
+import contextlib
+import hashlib
 import io
 import logging
 import threading
 import uuid
 import os
-import glob
+import json
+import re
+import time
 from services.no_breaks_report_generator import NoBreaksReportGenerator
-from services.sesame_api import SesameAPI
+from services.sesame_api import get_shared_api, reset_shared_api
+from services.report_state_store import ReportStateStore
+from services.reports_index import ReportsIndex
+from services.token_cache import (get_cached_token_info, get_cached_offices, get_cached_departments,
+                                  clear_token_caches, DIRECTORY_TTL_SECONDS)
+from services.check_types_service import CheckTypesService
+from models import SesameToken, CheckType
 from auth import requires_auth, check_auth, login_user, logout_user, authenticate
 from app import db
 
@@ -16,44 +28,72 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 MAX_REPORTS = 10
+TEMP_REPORTS_DIR = 'temp_reports'
+REPORT_RETENTION_SECONDS = 24 * 60 * 60
+JANITOR_INTERVAL_SECONDS = 15 * 60
+REPORT_FILE_EXTENSIONS = ('.xlsx', '.csv')
+# What the janitor reaps: report files plus leftover .tmp files
+_STALE_FILE_EXTENSIONS = REPORT_FILE_EXTENSIONS + ('.tmp',)
 
-# Store for background reports
-background_reports = {}
+# Created once here instead of on every report
+os.makedirs(TEMP_REPORTS_DIR, exist_ok=True)
+
+
+# Workers shared by every report request: threads are reused and at most
+# REPORT_WORKERS reports run at once, the rest wait in the executor queue
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', '4'))
+_report_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix='report')
+# Don't hold interpreter shutdown on queued reports; running ones finish on their own
+atexit.register(_report_executor.shutdown, wait=False, cancel_futures=True)
+
+# Small pool for side tasks of a request that can overlap its main API call,
+# kept apart from the report workers so they never queue behind a report
+_request_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='request')
+
+# Reports still being generated, keyed by a hash of their form data, so
+# identical concurrent requests share one job
+_inflight_reports = {}
+_inflight_lock = threading.Lock()
+
+# Statuses after which a report no longer changes
+FINAL_REPORT_STATUSES = frozenset({'completed', 'error', 'cancelled'})
+# Statuses of a report whose job has not finished yet
+ACTIVE_REPORT_STATUSES = frozenset({'starting', 'processing'})
+
+# Store for background reports; entries expire after a day. Beyond
+# MAX_TRACKED_REPORTS the least recently used finished reports are dropped;
+# reports still starting or processing are always kept, since their jobs
+# need their state to finish
+MAX_TRACKED_REPORTS = 128
+background_reports = ReportStateStore(ttl_seconds=REPORT_RETENTION_SECONDS, max_reports=MAX_TRACKED_REPORTS,
+                                      evictable_statuses=FINAL_REPORT_STATUSES)
+
+# Stored report files: '{report_id}_reporte_actividades_{YYYYMMDD_HHMMSS}.{xlsx|csv}'
+_REPORT_FILENAME_RE = re.compile(
+    r'^([0-9a-f-]{36})_(reporte_actividades_(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2})\.(?:xlsx|csv))$')
 
 def _enforce_report_limit(temp_dir, max_reports=MAX_REPORTS):
     """Enforce maximum number of reports, delete oldest if exceeded"""
     deleted_files = []
     try:
-        # Get all xlsx files in temp directory
-        report_files = glob.glob(os.path.join(temp_dir, '*.xlsx'))
-        
-        if len(report_files) <= max_reports:
-            return deleted_files
-        
-        # Sort files by modification time (oldest first)
-        report_files.sort(key=lambda x: os.path.getmtime(x))
-        
-        # Calculate how many files to delete
-        files_to_delete = len(report_files) - max_reports
-        
-        for i in range(files_to_delete):
-            file_to_delete = report_files[i]
+        # The index returns only the reports past the limit, oldest first
+        evicted_ids = []
+        for report in reports_index.beyond_limit(max_reports):
+            filename = os.path.basename(report['path'])
+            background_reports.delete(report['id'])
             try:
-                # Extract report_id from filename for cleanup
-                filename = os.path.basename(file_to_delete)
-                if '_' in filename:
-                    report_id = filename.split('_')[0]
-                    # Remove from background_reports if it exists
-                    if report_id in background_reports:
-                        del background_reports[report_id]
-                
-                # Delete the file
-                os.remove(file_to_delete)
-                deleted_files.append(filename)
-                logger.info(f"Deleted old report file: {filename} (enforcing {max_reports} report limit)")
-                
-            except Exception as e:
-                logger.warning(f"Failed to delete old report file {file_to_delete}: {str(e)}")
+                os.remove(report['path'])
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to delete old report file {report['path']}: {str(e)}")
+                continue
+            evicted_ids.append(report['id'])
+            deleted_files.append(filename)
+            logger.info(f"Deleted old report file: {filename} (enforcing {max_reports} report limit)")
+        
+        # Forget the whole batch in one transaction
+        reports_index.remove_many(evicted_ids)
                 
     except Exception as e:
         logger.error(f"Error enforcing report limit: {str(e)}")
@@ -61,101 +101,261 @@ def _enforce_report_limit(temp_dir, max_reports=MAX_REPORTS):
     return deleted_files
 
 
-def generate_report_background(report_id, form_data, app_instance):
+def _cleanup_stale_reports(temp_dir=TEMP_REPORTS_DIR, max_age_seconds=REPORT_RETENTION_SECONDS):
+    """Delete report files older than max_age_seconds and drop expired report state"""
+    deleted_files = []
+    cutoff = time.time() - max_age_seconds
+    
+    try:
+        with os.scandir(temp_dir) as entries:
+            for entry in entries:
+                try:
+                    # Leftover .tmp files are reports whose worker died mid-write
+                    if (entry.name.endswith(_STALE_FILE_EXTENSIONS) and entry.is_file()
+                            and entry.stat().st_mtime < cutoff):
+                        os.remove(entry.path)
+                        deleted_files.append(entry.name)
+                        parsed = _parse_report_filename(entry.name)
+                        if parsed:
+                            reports_index.remove(parsed[0])
+                except OSError as e:
+                    logger.warning(f"Failed to delete stale report file {entry.name}: {str(e)}")
+    except OSError as e:
+        logger.error(f"Error scanning {temp_dir} for stale reports: {str(e)}")
+    
+    expired_reports = background_reports.purge_expired()
+    if deleted_files or expired_reports:
+        logger.info(f"Janitor removed {len(deleted_files)} stale report file(s) and {expired_reports} expired report state(s)")
+    
+    return deleted_files
+
+
+def _run_report_janitor():
+    """Periodically clean up stale reports (runs in a daemon thread)"""
+    while True:
+        time.sleep(JANITOR_INTERVAL_SECONDS)
+        _cleanup_stale_reports()
+
+
+def _parse_report_filename(filename):
+    """Split '{report_id}_reporte_actividades_{YYYYMMDD_HHMMSS}.{ext}' into (report_id, original_filename, timestamp)"""
+    match = _REPORT_FILENAME_RE.match(filename)
+    if not match:
+        return None
+    
+    report_id, original_filename = match.group(1, 2)
+    # The regex already split out the timestamp fields, so no strptime
+    try:
+        timestamp = datetime(*map(int, match.groups()[2:]))
+    except ValueError:
+        timestamp = None
+    return report_id, original_filename, timestamp
+
+
+def _scan_report_files(temp_dir=TEMP_REPORTS_DIR):
+    """List the report files on disk in the shape stored by reports_index"""
+    reports = []
+    with os.scandir(temp_dir) as entries:
+        for entry in entries:
+            parsed = _parse_report_filename(entry.name)
+            if not parsed:
+                continue
+            try:
+                # One stat() gives both size and mtime
+                stat = entry.stat(follow_symlinks=False)
+            except OSError as e:
+                logger.warning(f"Error reading report file {entry.path}: {str(e)}")
+                continue
+            report_id, original_filename, timestamp = parsed
+            reports.append({
+                'id': report_id,
+                'path': entry.path,
+                'filename': original_filename,
+                'size': stat.st_size,
+                'created_at': timestamp or datetime.fromtimestamp(stat.st_mtime)
+            })
+    return reports
+
+
+# Index of report files; reconciled with the directory once at startup
+reports_index = ReportsIndex(os.path.join(TEMP_REPORTS_DIR, 'reports_index.sqlite3'))
+reports_index.sync(_scan_report_files())
+
+_janitor_thread = threading.Thread(target=_run_report_janitor, name='report-janitor', daemon=True)
+_janitor_thread.start()
+
+
+def _parse_form_date(value):
+    """Parse a YYYY-MM-DD form value into a date; None if it is not a real date"""
+    # Form dates come from <input type="date">, always YYYY-MM-DD. The shape
+    # check keeps out the other layouts fromisoformat accepts ('20240101',
+    # '2024-W01-1'); fromisoformat does the digit and range checks
+    if len(value) != 10 or value[4] != '-' or value[7] != '-':
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _set_report_state(report_id, expected_status=None, **changes):
+    """Update the stored state of a background report as one step
+
+    No-op if the report was removed, or if expected_status is given and the
+    report has moved on (e.g. it was cancelled). Returns whether it applied.
+    """
+    return background_reports.update(report_id, expected_status=expected_status, **changes)
+
+
+def _start_report_job(form_data):
+    """Register a new report job and dispatch it to a background worker, returning its id
+
+    A request identical to a report that is still starting or processing
+    gets that report's id instead of a second job scraping the same data.
+    """
+    job_key = hashlib.sha1(json.dumps(form_data, sort_keys=True).encode()).hexdigest()
+    with _inflight_lock:
+        report_id = _inflight_reports.get(job_key)
+        if report_id is not None:
+            report = background_reports.get(report_id)
+            if report is not None and report['status'] in ACTIVE_REPORT_STATUSES:
+                logger.info(f"[MAIN] Identical report {report_id} already in progress, reusing it")
+                return report_id
+        
+        report_id = str(uuid.uuid4())
+        _inflight_reports[job_key] = report_id
+    
+    # The state must exist before the job is submitted: the worker gets
+    # everything it needs as arguments and only touches the store through
+    # the guarded 'starting' -> 'processing' transition, which it treats as
+    # "cancelled or removed" if the state is not there
+    background_reports.put(report_id, {
+        'status': 'starting',
+        'created_at': datetime.now(),
+        'form_data': form_data
+    })
+    
+    # Hand the job to the shared worker pool; the worker pushes its own app context
+    future = _report_executor.submit(generate_report_background, report_id, dict(form_data),
+                                     current_app._get_current_object())
+    background_reports.update(report_id, future=future)
+    future.add_done_callback(lambda _: _forget_inflight_report(job_key, report_id))
+    logger.info(f"[MAIN] Report {report_id} submitted to the report workers")
+    
+    return report_id
+
+
+def _forget_inflight_report(job_key, report_id):
+    """Stop coalescing requests onto a finished job"""
+    with _inflight_lock:
+        if _inflight_reports.get(job_key) == report_id:
+            del _inflight_reports[job_key]
+
+
+def _fsync_dir(path):
+    """Flush a directory entry update (e.g. a rename) to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def generate_report_background(report_id, form_data, app):
     """Generate report in background thread"""
+    tmp_path = None
     try:
-        logger.info(f"[THREAD] Starting background thread for report {report_id}")
-        with app_instance.app_context():
-            logger.info(f"[THREAD] Inside app context - Starting background report generation - ID: {report_id}")
-            background_reports[report_id]['status'] = 'processing'
-            
-            # Generate report
-            report_data = None
-            
-            logger.info(f"[THREAD] Form data: {form_data}")
-            logger.info(f"[THREAD] Starting NO-BREAKS report generation - Type: {form_data['report_type']}")
-            
-            # Create a progress callback function
-            def update_progress(current_page, total_pages, current_records, total_records):
-                if report_id in background_reports:
-                    # Check if pagination is complete
-                    is_pagination_complete = (current_page >= total_pages)
-                    
-                    background_reports[report_id]['progress'] = {
-                        'current_page': current_page,
-                        'total_pages': total_pages,
-                        'current_records': current_records,
-                        'total_records': total_records,
-                        'pagination_complete': is_pagination_complete
-                    }
+        logger.info(f"[THREAD] Starting background report generation - ID: {report_id}")
+        if not _set_report_state(report_id, expected_status='starting', status='processing'):
+            logger.info(f"[THREAD] Report {report_id} was cancelled or removed before it started")
+            return
+        
+        logger.info(f"[THREAD] Form data: {form_data}")
+        logger.info(f"[THREAD] Starting NO-BREAKS report generation - Type: {form_data['report_type']}")
+        
+        # Create a progress callback function
+        def update_progress(current_page, total_pages, current_records, total_records):
+            # Check if pagination is complete
+            is_pagination_complete = (current_page >= total_pages)
             
+            _set_report_state(report_id, progress={
+                'current_page': current_page,
+                'total_pages': total_pages,
+                'current_records': current_records,
+                'total_records': total_records,
+                'pagination_complete': is_pagination_complete
+            })
+        
+        created_at = datetime.now()
+        timestamp = created_at.strftime("%Y%m%d_%H%M%S")
+        format_type = form_data.get('format', 'xlsx')
+        file_extension = 'csv' if format_type == 'csv' else 'xlsx'
+        filename = f"reporte_actividades_{timestamp}.{file_extension}"
+        file_path = os.path.join(TEMP_REPORTS_DIR, f"{report_id}_{filename}")
+        # Written under a .tmp name and renamed when complete, so a half-written
+        # report is never listed or downloaded
+        tmp_path = file_path + '.tmp'
+        
+        # Only the generation needs the app context (token and check types come
+        # from the DB); leaving it right after releases the DB session early
+        with app.app_context():
             no_breaks_generator = NoBreaksReportGenerator()
-            logger.info(f"[THREAD] Created NoBreaksReportGenerator instance")
-            report_data = no_breaks_generator.generate_report(
-                from_date=form_data['from_date'],
-                to_date=form_data['to_date'],
-                employee_id=form_data['employee_id'],
-                office_id=form_data['office_id'],
-                department_id=form_data['department_id'],
-                report_type=form_data['report_type'],
-                format=form_data.get('format', 'xlsx'),
-                progress_callback=update_progress)
-            logger.info(f"[THREAD] NO-BREAKS report generation completed successfully for report {report_id}")
-
-            if report_data:
-                # Save report to temporary file
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                format_type = form_data.get('format', 'xlsx')
-                file_extension = 'csv' if format_type == 'csv' else 'xlsx'
-                filename = f"reporte_actividades_{timestamp}.{file_extension}"
-                
-                # Create temp directory if it doesn't exist
-                temp_dir = 'temp_reports'
-                os.makedirs(temp_dir, exist_ok=True)
-                
-                # Save file
-                file_path = os.path.join(temp_dir, f"{report_id}_{filename}")
-                with open(file_path, 'wb') as f:
-                    f.write(report_data)
-                
-                # Check and enforce 10 report limit
-                deleted_files = _enforce_report_limit(temp_dir)
-                if deleted_files:
-                    logger.info(f"Deleted {len(deleted_files)} old report(s) to enforce 10 report limit: {', '.join(deleted_files)}")
-                
-                # Store filename and file_path in background_reports for later access
-                background_reports[report_id]['filename'] = filename
-                background_reports[report_id]['file_path'] = file_path
-                
-                # Update status outside app context to avoid DB connection issues
+            # Write the report straight into its file instead of holding the bytes in memory
+            with open(tmp_path, 'wb') as f:
+                report_written = no_breaks_generator.generate_report(
+                    from_date=form_data['from_date'],
+                    to_date=form_data['to_date'],
+                    employee_id=form_data['employee_id'],
+                    office_id=form_data['office_id'],
+                    department_id=form_data['department_id'],
+                    report_type=form_data['report_type'],
+                    format=format_type,
+                    progress_callback=update_progress,
+                    output=f)
+                if report_written:
+                    # Size from the open handle, without a stat() of the renamed file
+                    file_size = f.seek(0, os.SEEK_END)
+                    f.flush()
+                    os.fsync(f.fileno())
+        logger.info(f"[THREAD] NO-BREAKS report generation completed successfully for report {report_id}")
+
+        if report_written:
+            os.replace(tmp_path, file_path)
+            _fsync_dir(TEMP_REPORTS_DIR)
+            report_count = reports_index.add(report_id, file_path, filename, file_size, created_at)
+            
+            # Status, filename and file_path change together, so readers never
+            # see a completed report without its file; a cancelled report stays cancelled
+            if _set_report_state(report_id, expected_status='processing',
+                                 status='completed', filename=filename, file_path=file_path):
                 logger.info(f"Background report completed - ID: {report_id}, File: {filename}")
+                
+                # Only a newly stored report can push the count past the limit, and
+                # usually it doesn't. Evict after the status update, so the user isn't
+                # kept waiting on the deletes; one index query covers the whole batch
+                if report_count > MAX_REPORTS:
+                    deleted_files = _enforce_report_limit(TEMP_REPORTS_DIR)
+                    if deleted_files:
+                        logger.info(f"Deleted {len(deleted_files)} old report(s) to enforce 10 report limit: {', '.join(deleted_files)}")
             else:
-                logger.error("No report data generated")
-                background_reports[report_id]['status'] = 'error'
-                background_reports[report_id]['error'] = 'No se pudo generar el reporte'
+                # Cancelled while it was being written; cancel_report may already
+                # have deleted the indexed file
+                reports_index.remove(report_id)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(file_path)
+        else:
+            logger.error("No report data generated")
+            os.remove(tmp_path)
+            _set_report_state(report_id, expected_status='processing',
+                              status='error', error='No se pudo generar el reporte')
                 
     except Exception as e:
         logger.error(f"Background report generation failed - ID: {report_id}, Error: {str(e)}")
-        background_reports[report_id]['status'] = 'error'
-        background_reports[report_id]['error'] = f'Error al generar el reporte: {str(e)}'
-        
-    # Update status outside app context to avoid DB SSL issues
-    try:
-        # Check if report was generated successfully by checking if the status is still 'processing'
-        # and if we reached this point without errors
-        if background_reports[report_id]['status'] == 'processing':
-            # The report was generated successfully if we get here
-            background_reports[report_id]['status'] = 'completed'
-            logger.info(f"[THREAD] Report status updated to COMPLETED - ID: {report_id}")
-            # Use the filename and file_path that were set above
-            # The variables are already set in the scope above (lines 91 and 98)
-        # If status is not 'processing', it means an error occurred earlier
-        
-    except Exception as e:
-        logger.error(f"Error updating report status - ID: {report_id}, Error: {str(e)}")
-        if report_id in background_reports:
-            background_reports[report_id]['status'] = 'error'
-            background_reports[report_id]['error'] = 'Error en el proceso final'
+        # A cancelled report stays cancelled even if its worker then fails
+        _set_report_state(report_id, expected_status='processing',
+                          status='error', error=f'Error al generar el reporte: {str(e)}')
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
 @main_bp.route('/login', methods=['GET', 'POST'])
@@ -186,10 +386,7 @@ def index():
     """Main page with report generation form and background report generation"""
     if request.method == 'GET':
         # Check if there's an active token configured
-        from models import SesameToken
-        active_token = SesameToken.get_active_token()
-        
-        if not active_token:
+        if not SesameToken.has_active_token():
             # No token configured, redirect to connection page
             flash('Debes configurar un token de API antes de generar reportes', 'warning')
             return redirect(url_for('main.connection'))
@@ -207,28 +404,24 @@ def index():
         department_id = request.form.get('department_id')
         report_type = request.form.get('report_type', 'by_employee')
 
-        # Validate dates
+        # Validate dates once here; the job gets them in canonical YYYY-MM-DD
+        # form (or None when not given) and passes them through untouched
+        from_date_parsed = to_date_parsed = None
         if from_date:
-            try:
-                datetime.strptime(from_date, '%Y-%m-%d')
-            except ValueError:
+            from_date_parsed = _parse_form_date(from_date)
+            if from_date_parsed is None:
                 flash('Fecha de inicio inválida', 'error')
                 return render_template('index.html')
 
         if to_date:
-            try:
-                datetime.strptime(to_date, '%Y-%m-%d')
-            except ValueError:
+            to_date_parsed = _parse_form_date(to_date)
+            if to_date_parsed is None:
                 flash('Fecha de fin inválida', 'error')
                 return render_template('index.html')
 
-        # Generate unique report ID
-        report_id = str(uuid.uuid4())
-        
-        # Store form data and initial status
         form_data = {
-            'from_date': from_date,
-            'to_date': to_date,
+            'from_date': from_date_parsed.isoformat() if from_date_parsed else None,
+            'to_date': to_date_parsed.isoformat() if to_date_parsed else None,
             'employee_id': employee_id,
             'office_id': office_id,
             'department_id': department_id,
@@ -236,20 +429,15 @@ def index():
             'format': request.form.get('format', 'xlsx')
         }
         
-        background_reports[report_id] = {
-            'status': 'starting',
-            'created_at': datetime.now(),
-            'form_data': form_data
-        }
-        
-        # Start background thread with app context
-        from app import app
-        logger.info(f"[MAIN] About to start thread for report {report_id}")
-        thread = threading.Thread(target=generate_report_background, args=(report_id, form_data, app))
-        thread.daemon = True
-        thread.start()
-        logger.info(f"[MAIN] Thread started for report {report_id}")
-        
+        report_id = _start_report_job(form_data)
+
+        # API clients get the job id back immediately and poll /report-status
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({
+                'status': 'accepted',
+                'report_id': report_id,
+                'status_url': url_for('main.report_status', report_id=report_id)
+            }), 202
 
         return render_template('index.html', report_id=report_id)
 
@@ -259,14 +447,35 @@ def index():
         return render_template('index.html')
 
 
-@main_bp.route('/report-status/<report_id>')
-@requires_auth
-def report_status(report_id):
-    """Check the status of a background report"""
-    if report_id not in background_reports:
-        return jsonify({'status': 'not_found'}), 404
+def _get_report(report_id):
+    """Get the state of a report, falling back to its file on disk
+
+    Report state lives in this process only; a report generated by another
+    worker (or before a restart) is still found through the reports index
+    and reported as completed.
+    """
+    report = background_reports.get(report_id)
+    if report is not None:
+        return report
+    return _get_report_from_disk(report_id)
+
+
+def _get_report_from_disk(report_id):
+    """Build a completed report state from the reports index, if the file is there"""
+    indexed = reports_index.get(report_id)
+    if indexed is None or not os.path.exists(indexed['path']):
+        return None
     
-    report = background_reports[report_id]
+    return {
+        'status': 'completed',
+        'created_at': indexed['created_at'],
+        'filename': indexed['filename'],
+        'file_path': indexed['path']
+    }
+
+
+def _report_status_payload(report, download_url):
+    """Build the status payload shared by /report-status and /report-events"""
     response_data = {
         'status': report['status'],
         'created_at': report['created_at'].isoformat(),
@@ -278,19 +487,125 @@ def report_status(report_id):
     if 'progress' in report:
         response_data['progress'] = report['progress']
     
-    return jsonify(response_data)
+    # Point the client straight at the file once it is ready
+    if report['status'] == 'completed':
+        response_data['download_url'] = download_url
+    
+    return response_data
+
+
+def _dump_status_json(payload):
+    """Serialize a status payload compactly, straight through json.dumps
+
+    Status is polled and streamed for every running report, so it skips the
+    Flask JSON provider and its whitespace and ASCII escaping of Spanish text.
+    """
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+
+
+def _report_status_etag(report):
+    """ETag for the status payload of a report: changes whenever the payload would"""
+    fingerprint = repr((report['status'], report['created_at'], report.get('filename', ''),
+                        report.get('error', ''), report.get('progress')))
+    return hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+@main_bp.route('/report-status/<report_id>')
+@requires_auth
+def report_status(report_id):
+    """Check the status of a background report"""
+    report = _get_report(report_id)
+    if report is None:
+        return jsonify({'status': 'not_found'}), 404
+    
+    # Polls while nothing changed get a bodyless 304 instead of the same JSON again
+    etag = _report_status_etag(report)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        download_url = url_for('main.download_report', report_id=report_id)
+        response = Response(_dump_status_json(_report_status_payload(report, download_url)),
+                            mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@main_bp.route('/report-events/<report_id>')
+@requires_auth
+def report_events(report_id):
+    """Push report status changes to the browser as Server-Sent Events"""
+    if _get_report(report_id) is None:
+        return jsonify({'status': 'not_found'}), 404
+    
+    # Resolved up front: the generator runs after the request context is gone
+    download_url = url_for('main.download_report', report_id=report_id)
+    
+    def stream():
+        last_payload = None
+        # Close the stream after a while; EventSource reconnects on its own
+        deadline = time.monotonic() + 300
+        
+        while time.monotonic() < deadline:
+            report, version = background_reports.get_versioned(report_id)
+            if report is None:
+                report = _get_report_from_disk(report_id)
+            if report is None:
+                yield f"data: {_dump_status_json({'status': 'not_found'})}\n\n"
+                return
+            
+            payload = _report_status_payload(report, download_url)
+            if payload != last_payload:
+                last_payload = payload
+                yield f"data: {_dump_status_json(payload)}\n\n"
+                if payload['status'] in FINAL_REPORT_STATUSES:
+                    return
+            else:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+            
+            if version is None:
+                # Only state from the reports index: completed, so already sent
+                return
+            # Woken only by changes to this report
+            background_reports.wait_for_change(report_id, version, timeout=15)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def _send_report_file(file_path, download_name):
+    """Stream a report file from disk as an attachment"""
+    # Determine mimetype based on file extension
+    if download_name.endswith('.csv'):
+        mimetype = 'text/csv'
+    else:
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    
+    # Passing the path lets the server stream it (wsgi.file_wrapper/sendfile)
+    # instead of reading it into memory, or hand it off entirely when
+    # USE_X_SENDFILE is on; conditional enables Range requests
+    return send_file(
+        file_path,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        max_age=0
+    )
 
 
 @main_bp.route('/download-report/<report_id>')
 @requires_auth
 def download_report(report_id):
     """Download a completed background report"""
-    if report_id not in background_reports:
+    report = _get_report(report_id)
+    if report is None:
         flash('Reporte no encontrado', 'error')
         return redirect(url_for('main.index'))
     
-    report = background_reports[report_id]
-    
     if report['status'] != 'completed':
         flash('Reporte no está listo para descarga', 'error')
         return redirect(url_for('main.index'))
@@ -300,46 +615,49 @@ def download_report(report_id):
         return redirect(url_for('main.index'))
     
     try:
-        # Determine mimetype based on file extension
-        if report['filename'].endswith('.csv'):
-            mimetype = 'text/csv'
-        else:
-            mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        
-        return send_file(
-            report['file_path'],
-            mimetype=mimetype,
-            as_attachment=True,
-            download_name=report['filename']
-        )
+        response = _send_report_file(report['file_path'], report['filename'])
+        # The file is downloaded; from now on the reports index describes it
+        background_reports.delete(report_id)
+        return response
     except Exception as e:
         logger.error(f"Error downloading report {report_id}: {str(e)}")
         flash(f'Error al descargar el reporte: {str(e)}', 'error')
         return redirect(url_for('main.index'))
 
 
+def _get_company_name(token_info_result):
+    """Extract the company name from a get_token_info() response"""
+    company_name = "Empresa no identificada"
+    if token_info_result:
+        if 'data' in token_info_result and 'company' in token_info_result['data']:
+            company_name = token_info_result['data']['company'].get('name', company_name)
+        elif 'company' in token_info_result:
+            company_name = token_info_result['company'].get('name', company_name)
+    return company_name
+
+
+def _ensure_check_types_cached(app):
+    """Make sure check types are cached (runs on _request_executor)"""
+    with app.app_context():
+        return CheckTypesService().ensure_check_types_cached()
+
+
 @main_bp.route('/test-connection')
 @requires_auth
 def test_connection():
     """Test API connection"""
     try:
-        from services.sesame_api import SesameAPI
-        api = SesameAPI()
-        result = api.get_token_info()
+        # The check types cache is verified (and synced if empty) while the token
+        # is being checked, instead of after it
+        check_types_future = _request_executor.submit(
+            _ensure_check_types_cached, current_app._get_current_object())
+        result = get_cached_token_info(get_shared_api())
         
         if result:
-            # Extract company name from the API response
-            company_name = "Empresa no identificada"
-            if 'data' in result and 'company' in result['data']:
-                company_name = result['data']['company'].get('name', 'Empresa no identificada')
-            elif 'company' in result:
-                company_name = result['company'].get('name', 'Empresa no identificada')
+            company_name = _get_company_name(result)
             
-            # Sync check types when connection is tested successfully
             try:
-                from services.check_types_service import CheckTypesService
-                check_types_service = CheckTypesService()
-                check_types_service.ensure_check_types_cached()
+                check_types_future.result(timeout=5)
             except Exception as e:
                 logger.warning(f"Failed to verify check types cache after connection test: {str(e)}")
                 # Don't fail the connection test if check types sync fails
@@ -368,7 +686,6 @@ def test_connection():
 def refresh_check_types():
     """Refresh check types from API"""
     try:
-        from services.check_types_service import CheckTypesService
         check_types_service = CheckTypesService()
         result = check_types_service.refresh_check_types()
         
@@ -390,95 +707,6 @@ def refresh_check_types():
         }), 500
 
 
-def _process_break_redistribution(time_entries, break_entries):
-    """Process break time redistribution based on workEntryType"""
-    # Group entries by date and employee
-    grouped_entries = {}
-    
-    for entry in time_entries:
-        date = entry.get('date', '')
-        employee_id = entry.get('employeeId', '')
-        key = f"{date}_{employee_id}"
-        
-        if key not in grouped_entries:
-            grouped_entries[key] = {'work_entries': [], 'break_entries': []}
-        
-        grouped_entries[key]['work_entries'].append(entry)
-    
-    # Add break entries to their respective groups
-    for entry in break_entries:
-        date = entry.get('date', '')
-        employee_id = entry.get('employeeId', '')
-        key = f"{date}_{employee_id}"
-        
-        if key in grouped_entries:
-            grouped_entries[key]['break_entries'].append(entry)
-    
-    # Process each group
-    processed_entries = []
-    
-    for key, group in grouped_entries.items():
-        work_entries = group['work_entries']
-        break_entries = group['break_entries']
-        
-        # Sort work entries by start time
-        work_entries.sort(key=lambda x: x.get('startTime', ''))
-        
-        # Calculate total break time
-        total_break_seconds = 0
-        for break_entry in break_entries:
-            work_entry_type = break_entry.get('workEntryType', '')
-            if work_entry_type == 'pause':
-                start_time = break_entry.get('startTime', '')
-                end_time = break_entry.get('endTime', '')
-                
-                if start_time and end_time:
-                    try:
-                        start_dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                        end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-                        break_seconds = (end_dt - start_dt).total_seconds()
-                        total_break_seconds += break_seconds
-                    except:
-                        pass
-        
-        # Redistribute break time to work entries
-        if total_break_seconds > 0 and work_entries:
-            break_seconds_per_entry = total_break_seconds / len(work_entries)
-            
-            for work_entry in work_entries:
-                original_start = work_entry.get('startTime', '')
-                original_end = work_entry.get('endTime', '')
-                
-                if original_start and original_end:
-                    try:
-                        start_dt = datetime.fromisoformat(original_start.replace('Z', '+00:00'))
-                        end_dt = datetime.fromisoformat(original_end.replace('Z', '+00:00'))
-                        
-                        # Add break time to the work entry
-                        new_end_dt = end_dt + timedelta(seconds=break_seconds_per_entry)
-                        work_entry['endTime'] = new_end_dt.isoformat()
-                    except:
-                        pass
-        
-        processed_entries.extend(work_entries)
-    
-    return processed_entries
-
-
-def _format_duration(duration):
-    """Format duration as HH:MM:SS"""
-    if isinstance(duration, timedelta):
-        total_seconds = int(duration.total_seconds())
-    else:
-        total_seconds = int(duration)
-    
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
-    
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-
-
 @main_bp.route('/conexion')
 @requires_auth
 def connection():
@@ -502,27 +730,19 @@ def apply_token():
                 'message': 'Token is required'
             }), 400
         
-        # Import here to avoid circular imports
-        from models import SesameToken
-        
         # Set the new token as active
         SesameToken.set_active_token(new_token, description, region)
+        reset_shared_api()
+        clear_token_caches()
+        CheckTypesService.forget_last_sync()
         
         # Test the token and get company info
-        from services.sesame_api import SesameAPI
-        api = SesameAPI()
-        result = api.get_token_info()
+        result = get_cached_token_info(get_shared_api())
         
-        company_name = "Empresa no identificada"
+        company_name = _get_company_name(result)
         if result:
-            if 'data' in result and 'company' in result['data']:
-                company_name = result['data']['company'].get('name', 'Empresa no identificada')
-            elif 'company' in result:
-                company_name = result['company'].get('name', 'Empresa no identificada')
-            
             # Sync check types when token is successfully configured
             try:
-                from services.check_types_service import CheckTypesService
                 check_types_service = CheckTypesService()
                 check_types_service.sync_check_types()
                 logger.info("Check types synchronized successfully after token configuration")
@@ -549,10 +769,11 @@ def apply_token():
 def remove_connection():
     """Remove/close the current connection"""
     try:
-        from models import SesameToken, CheckType
-        
         # Remove all tokens
         SesameToken.remove_all_tokens()
+        reset_shared_api()
+        clear_token_caches()
+        CheckTypesService.forget_last_sync()
         
         # Also clear check types cache since they're associated with the token
         CheckType.query.delete()
@@ -576,22 +797,11 @@ def remove_connection():
 def get_current_token():
     """Get information about current token (masked for security)"""
     try:
-        from models import SesameToken
-        from services.sesame_api import SesameAPI
-        
         token_info = SesameToken.get_active_token()
         
         if token_info:
             # Get company name from API
-            api = SesameAPI()
-            result = api.get_token_info()
-            
-            company_name = "Empresa no identificada"
-            if result:
-                if 'data' in result and 'company' in result['data']:
-                    company_name = result['data']['company'].get('name', 'Empresa no identificada')
-                elif 'company' in result:
-                    company_name = result['company'].get('name', 'Empresa no identificada')
+            company_name = _get_company_name(get_cached_token_info(get_shared_api()))
             
             # Mask the token for security
             masked_token = token_info.token[:8] + '*' * (len(token_info.token) - 12) + token_info.token[-4:]
@@ -660,22 +870,24 @@ def check_processing_reports():
 def cancel_report(report_id):
     """Cancel a report that is being processed"""
     try:
-        if report_id in background_reports:
-            report_status = background_reports[report_id]
-            
-            # Mark as cancelled
-            report_status['status'] = 'cancelled'
-            report_status['cancelled_at'] = datetime.now().isoformat()
+        report = background_reports.get(report_id)
+        if report is not None:
+            # Mark as cancelled, and drop the job if it is still waiting for a worker
+            _set_report_state(report_id, status='cancelled', cancelled_at=datetime.now().isoformat())
+            future = report.get('future')
+            if future is not None:
+                future.cancel()
             
-            # Clean up any partial files
-            temp_dir = 'temp_reports'
-            pattern = os.path.join(temp_dir, f"{report_id}_*.xlsx")
-            for file_path in glob.glob(pattern):
+            # A running worker discards its own partial file once it sees the
+            # cancellation; only an already stored report has a file to delete here
+            indexed = reports_index.get(report_id)
+            if indexed:
                 try:
-                    os.remove(file_path)
-                    logger.info(f"Deleted cancelled report file: {file_path}")
+                    os.remove(indexed['path'])
+                    logger.info(f"Deleted cancelled report file: {indexed['path']}")
                 except Exception as e:
                     logger.warning(f"Failed to delete cancelled report file: {str(e)}")
+                reports_index.remove(report_id)
             
             return jsonify({
                 'status': 'success',
@@ -701,58 +913,22 @@ def downloads():
     """Downloads page - show all generated reports"""
     try:
         # Check if there's an active token configured
-        from models import SesameToken
-        active_token = SesameToken.get_active_token()
-        
-        if not active_token:
+        if not SesameToken.has_active_token():
             # No token configured, redirect to connection page
             flash('Debes configurar un token de API antes de acceder a las descargas', 'warning')
             return redirect(url_for('main.connection'))
         
-        # Get all report files from temp directory
-        temp_dir = 'temp_reports'
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir, exist_ok=True)
-        
-        # Get all xlsx files in temp directory
-        report_files = glob.glob(os.path.join(temp_dir, '*.xlsx'))
-        
-        # Parse file information
-        reports = []
-        for file_path in report_files:
-            try:
-                filename = os.path.basename(file_path)
-                # Extract report_id and timestamp from filename
-                # Format: {report_id}_reporte_actividades_{timestamp}.xlsx
-                parts = filename.split('_')
-                if len(parts) >= 4:
-                    report_id = parts[0]
-                    timestamp_str = parts[3] + '_' + parts[4].replace('.xlsx', '')
-                    
-                    # Parse timestamp
-                    try:
-                        timestamp = datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
-                    except:
-                        timestamp = datetime.fromtimestamp(os.path.getmtime(file_path))
-                    
-                    # Get file size
-                    file_size = os.path.getsize(file_path)
-                    file_size_mb = round(file_size / (1024 * 1024), 2)
-                    
-                    reports.append({
-                        'id': report_id,
-                        'filename': filename,
-                        'original_filename': f"reporte_actividades_{timestamp_str}.xlsx",
-                        'created_at': timestamp,
-                        'size_mb': file_size_mb,
-                        'file_path': file_path
-                    })
-            except Exception as e:
-                logger.warning(f"Error parsing report file {file_path}: {str(e)}")
-                continue
-        
-        # Sort by creation date (newest first)
-        reports.sort(key=lambda x: x['created_at'], reverse=True)
+        # Newest first, straight from the reports index: no directory walk,
+        # stat() or filename parsing when the page is rendered
+        reports = [
+            {
+                'id': report['id'],
+                'original_filename': report['filename'],
+                'created_at': report['created_at'],
+                'size_mb': round(report['size'] / (1024 * 1024), 2)
+            }
+            for report in reports_index.list()
+        ]
         
         return render_template('downloads.html', reports=reports, max_reports=MAX_REPORTS)
         
@@ -767,27 +943,13 @@ def downloads():
 def download_report_by_id(report_id):
     """Download a specific report by ID"""
     try:
-        temp_dir = 'temp_reports'
-        # Find the file that starts with the report_id
-        pattern = os.path.join(temp_dir, f"{report_id}_*.xlsx")
-        matching_files = glob.glob(pattern)
+        report = reports_index.get(report_id)
         
-        if not matching_files:
+        if not report or not os.path.exists(report['path']):
             flash('Reporte no encontrado', 'error')
             return redirect(url_for('main.downloads'))
         
-        file_path = matching_files[0]
-        filename = os.path.basename(file_path)
-        
-        # Extract original filename
-        parts = filename.split('_')
-        if len(parts) >= 4:
-            timestamp_str = parts[3] + '_' + parts[4].replace('.xlsx', '')
-            original_filename = f"reporte_actividades_{timestamp_str}.xlsx"
-        else:
-            original_filename = filename
-        
-        return send_file(file_path, as_attachment=True, download_name=original_filename)
+        return _send_report_file(report['path'], report['filename'])
         
     except Exception as e:
         logger.error(f"Error downloading report {report_id}: {str(e)}")
@@ -800,25 +962,21 @@ def download_report_by_id(report_id):
 def delete_report(report_id):
     """Delete a specific report"""
     try:
-        temp_dir = 'temp_reports'
-        # Find the file that starts with the report_id
-        pattern = os.path.join(temp_dir, f"{report_id}_*.xlsx")
-        matching_files = glob.glob(pattern)
+        report = reports_index.get(report_id)
         
-        if not matching_files:
+        if not report:
             return jsonify({
                 'status': 'error',
                 'message': 'Reporte no encontrado'
             }), 404
         
-        file_path = matching_files[0]
-        
         # Delete the file
-        os.remove(file_path)
+        if os.path.exists(report['path']):
+            os.remove(report['path'])
+        reports_index.remove(report_id)
         
         # Also remove from background_reports if it exists
-        if report_id in background_reports:
-            del background_reports[report_id]
+        background_reports.delete(report_id)
         
         return jsonify({
             'status': 'success',
@@ -838,15 +996,17 @@ def delete_report(report_id):
 def get_offices():
     """Get list of offices"""
     try:
-        api = SesameAPI()
-        response = api.get_offices()
+        response = get_cached_offices(get_shared_api())
         
         if response and 'data' in response:
             offices = response['data']
-            return jsonify({
+            result = jsonify({
                 'status': 'success',
                 'offices': offices
             })
+            # Rarely changes: let the browser reuse it for as long as the server does
+            result.headers['Cache-Control'] = f'private, max-age={DIRECTORY_TTL_SECONDS}'
+            return result
         else:
             return jsonify({
                 'status': 'error',
@@ -866,15 +1026,17 @@ def get_offices():
 def get_departments():
     """Get list of departments"""
     try:
-        api = SesameAPI()
-        response = api.get_departments()
+        response = get_cached_departments(get_shared_api())
         
         if response and 'data' in response:
             departments = response['data']
-            return jsonify({
+            result = jsonify({
                 'status': 'success',
                 'departments': departments
             })
+            # Rarely changes: let the browser reuse it for as long as the server does
+            result.headers['Cache-Control'] = f'private, max-age={DIRECTORY_TTL_SECONDS}'
+            return result
         else:
             return jsonify({
                 'status': 'error',
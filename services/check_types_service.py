@@ -1,8 +1,10 @@
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
-from services.sesame_api import SesameAPI
+from services.sesame_api import get_shared_api
 from models import CheckType
-from app import db
 
 logger = logging.getLogger(__name__)
 
@@ -10,69 +12,101 @@ logger = logging.getLogger(__name__)
 class CheckTypesService:
     """Service to manage check types (activity types) caching"""
     
+    # Syncs are serialized process-wide; one that finished this recently for
+    # the same token is reused by callers that were waiting on it instead of
+    # fetching again. (token, time.monotonic()) of the last sync, or None.
+    _sync_lock = threading.Lock()
+    _last_sync = None
+    _SYNC_REUSE_SECONDS = 5.0
+    
     def __init__(self):
-        self.api = SesameAPI()
+        # The process-wide client, so syncs reuse its pooled connections
+        self.api = get_shared_api()
+    
+    @classmethod
+    def forget_last_sync(cls):
+        """Make the next sync fetch again (call after the token is changed or removed)"""
+        with cls._sync_lock:
+            cls._last_sync = None
     
     def sync_check_types(self) -> bool:
         """Sync all check types from API to database"""
-        try:
-            # Get all check types from API using pagination
-            check_types = self._get_all_check_types()
+        with CheckTypesService._sync_lock:
+            last_sync = CheckTypesService._last_sync
+            if (last_sync is not None and last_sync[0] == self.api.token
+                    and time.monotonic() - last_sync[1] < self._SYNC_REUSE_SECONDS):
+                return True
             
-            if not check_types:
-                logger.error("No check types retrieved from API")
-                return False
-            
-            # Bulk upsert to database
-            CheckType.bulk_upsert(check_types)
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error synchronizing check types: {str(e)}")
-            return False
-    
-    def _get_all_check_types(self) -> List[Dict]:
-        """Get all check types from API with pagination"""
-        all_check_types = []
-        page = 1
-        
-        while True:
             try:
-                response = self.api.get_check_types(page=page, limit=100)
-                
-                if not response or 'data' not in response:
-                    break
-                
-                check_types = response['data']
+                # Get all check types from API using pagination
+                check_types = self._get_all_check_types()
                 
                 if not check_types:
-                    break
-                
-                # Process each check type
-                for check_type in check_types:
-                    processed_type = {
-                        'id': check_type.get('id', ''),
-                        'name': check_type.get('name', ''),
-                        'description': check_type.get('description', '')
-                    }
-                    all_check_types.append(processed_type)
+                    logger.error("No check types retrieved from API")
+                    return False
                 
-                # Check if there are more pages
-                metadata = response.get('metadata', {})
-                total_pages = metadata.get('totalPages', 1)
+                # Bulk upsert to database
+                CheckType.bulk_upsert(check_types)
                 
-                if page >= total_pages:
-                    break
-                
-                page += 1
+                CheckTypesService._last_sync = (self.api.token, time.monotonic())
+                return True
                 
             except Exception as e:
-                logger.error(f"Error getting check types page {page}: {str(e)}")
+                logger.error(f"Error synchronizing check types: {str(e)}")
+                return False
+    
+    def _get_all_check_types(self) -> List[Dict]:
+        """Get all check types from API with pagination
+
+        The first page tells how many pages there are; the rest are fetched
+        concurrently.
+        """
+        all_check_types = []
+        
+        response = self._get_check_types_page(1)
+        if not response:
+            return all_check_types
+        
+        # Check if there are more pages
+        metadata = response.get('metadata', {})
+        total_pages = metadata.get('totalPages', 1)
+        
+        responses = [response]
+        if total_pages > 1:
+            with ThreadPoolExecutor(max_workers=min(8, total_pages - 1)) as executor:
+                responses.extend(executor.map(self._get_check_types_page, range(2, total_pages + 1)))
+        
+        for response in responses:
+            # Stop at the first missing page, like the sequential walk did
+            if not response:
                 break
+            
+            # Keep only the fields stored in the database
+            all_check_types.extend(
+                {
+                    'id': check_type.get('id', ''),
+                    'name': check_type.get('name', ''),
+                    'description': check_type.get('description', '')
+                }
+                for check_type in response['data']
+            )
         
         return all_check_types
     
+    def _get_check_types_page(self, page: int) -> Optional[Dict]:
+        """Get one page of check types, or None if it failed or is empty"""
+        try:
+            response = self.api.get_check_types(page=page, limit=100)
+            
+            if not response or not response.get('data'):
+                return None
+            
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error getting check types page {page}: {str(e)}")
+            return None
+    
     def get_activity_name(self, work_entry_type: str, work_break_id: Optional[str]) -> str:
         """Get activity name based on work entry type and break ID"""
         try:
@@ -91,13 +125,29 @@ class CheckTypesService:
             logger.error(f"Error getting activity name: {str(e)}")
             return 'Actividad desconocida'
     
+    def get_activity_names(self, keys) -> Dict[tuple, str]:
+        """Activity names for many (work_entry_type, work_break_id) pairs
+
+        Check type names for every break ID are loaded with one query instead
+        of one get_name_by_id query per break ID.
+        """
+        keys = set(keys)
+        try:
+            names = CheckType.get_names_by_ids({work_break_id for _, work_break_id in keys if work_break_id})
+        except Exception as e:
+            logger.error(f"Error loading check type names: {str(e)}")
+            return {key: self.get_activity_name(*key) for key in keys}
+        
+        return {
+            key: names.get(key[1], 'Actividad desconocida') if key[1] else self.get_activity_name(*key)
+            for key in keys
+        }
+    
     def ensure_check_types_cached(self) -> bool:
         """Ensure check types are cached in database"""
         try:
             # Check if we have any check types in database
-            check_types_count = CheckType.query.count()
-            
-            if check_types_count == 0:
+            if not CheckType.has_any():
                 return self.sync_check_types()
             
             return True
@@ -109,13 +159,20 @@ class CheckTypesService:
     def refresh_check_types(self) -> bool:
         """Force refresh of check types from API"""
         try:
-            # Delete all existing check types
-            CheckType.query.delete()
-            db.session.commit()
+            # Fetch before touching the table, so a failed fetch keeps the old check types
+            check_types = self._get_all_check_types()
+            
+            if not check_types:
+                logger.error("No check types retrieved from API")
+                return False
             
-            # Sync from API
-            return self.sync_check_types()
+            # Delete and reinsert in one transaction - readers never see an empty table
+            with CheckTypesService._sync_lock:
+                CheckType.replace_all(check_types)
+                CheckTypesService._last_sync = (self.api.token, time.monotonic())
+            
+            return True
             
         except Exception as e:
             logger.error(f"Error refreshing check types: {str(e)}")
-            return False
\ No newline at end of file
+            return False
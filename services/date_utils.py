@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict
+
+try:
+    # Optional C parser; used for timestamps outside the fixed API layout
+    from ciso8601 import parse_datetime as _parse_iso_fallback
+except ImportError:
+    _parse_iso_fallback = datetime.fromisoformat
+
+# Offsets seen in API timestamps ('+02:00', '-03:00', ...) mapped to tzinfo objects
+_OFFSETS: Dict[str, timezone] = {'Z': timezone.utc, '+00:00': timezone.utc}
+
+
+def _get_offset(offset: str) -> timezone:
+    """Get (and remember) the tzinfo for an ISO offset suffix"""
+    tz = _OFFSETS.get(offset)
+    if tz is None:
+        sign = -1 if offset[0] == '-' else 1
+        tz = timezone(sign * timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6])))
+        _OFFSETS[offset] = tz
+    return tz
+
+
+@lru_cache(maxsize=4096)
+def parse_iso_datetime(date_str: str) -> datetime:
+    """Parse an ISO timestamp from the Sesame API into an aware datetime
+
+    The API uses the fixed 'YYYY-MM-DDTHH:MM:SS' layout followed by 'Z' or a
+    '+HH:MM' offset, so the fields are sliced directly instead of going through
+    str.replace + datetime.fromisoformat. Any other layout falls back to
+    ciso8601 when it is installed, or fromisoformat otherwise; both raise
+    ValueError for invalid input.
+
+    The same timestamps come up repeatedly while building a report (sorting,
+    grouping, break redistribution and row output), so results are memoized;
+    datetimes are immutable, so sharing them is safe.
+    """
+    length = len(date_str)
+    if (length == 20 or length == 25) and date_str[4] == '-' and date_str[10] == 'T' and date_str[19] in 'Z+-':
+        return datetime(int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]),
+                        int(date_str[11:13]), int(date_str[14:16]), int(date_str[17:19]),
+                        tzinfo=_get_offset(date_str[19:]))
+
+    # Both parsers accept a 'Z' suffix (fromisoformat since Python 3.11)
+    return _parse_iso_fallback(date_str)
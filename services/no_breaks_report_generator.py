@@ -1,121 +1,279 @@
 import openpyxl
 import csv
 import logging
+from collections import defaultdict
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Union
-from io import BytesIO, StringIO
-from openpyxl.styles import Font, PatternFill, Alignment
-from services.sesame_api import SesameAPI
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO, TextIOWrapper
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, NamedStyle
+from services.sesame_api import SesameAPI, get_shared_api
 from services.parallel_sesame_api import ParallelSesameAPI
+from services.check_types_service import CheckTypesService
+from services.date_utils import parse_iso_datetime
+
+logger = logging.getLogger(__name__)
+
+# Group/date of an item in the by_group reports
+_group_date_key = itemgetter('group_name', 'entry_date')
+
+# Header and TOTAL row styles, shared by every cell that uses them
+_HEADER_FONT = Font(bold=True)
+_HEADER_FILL = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+_TOTAL_FONT = Font(bold=True)
+_TOTAL_FILL = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
+
+# Added to early-morning start times so night shifts sort after the evening
+_ONE_DAY = timedelta(hours=24)
+
+# Zero-padded '00'..'99', so HH:MM:SS is built by indexing instead of formatting
+_PAD = ['%02d' % i for i in range(100)]
+
+
+@lru_cache(maxsize=4096)
+def _format_hms(seconds: int) -> str:
+    """Format whole seconds as HH:MM:SS
+
+    Report rows repeat the same durations over and over (full shifts, fixed
+    breaks), so each distinct value is only formatted once.
+    """
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if 0 <= hours < 100:
+        return f"{_PAD[hours]}:{_PAD[minutes]}:{_PAD[seconds]}"
+    return '%02d:%02d:%02d' % (hours, minutes, seconds)
+
+
+@lru_cache(maxsize=4096)
+def _split_iso_datetime(date_str: str) -> tuple:
+    """Split an API timestamp into ('dd/mm/YYYY', 'HH:MM:SS') without parsing it
+
+    Break redistribution makes one entry's end the next one's start, so the
+    same timestamps are split again and again while writing rows.
+    """
+    # The API returns 'YYYY-MM-DDTHH:MM:SS' plus offset, so one partition is enough
+    date_part, sep, time_part = date_str.partition('T')
+    if not sep or len(date_part) != 10 or len(time_part) < 8:
+        raise ValueError(f"Invalid isoformat string: {date_str!r}")
+    
+    return f"{date_part[8:10]}/{date_part[5:7]}/{date_part[:4]}", time_part[:8]
+
+
+def _format_dmy(value: datetime) -> str:
+    """Format a date as dd/mm/YYYY, like strftime('%d/%m/%Y') without its locale machinery"""
+    return f"{_PAD[value.day]}/{_PAD[value.month]}/{value.year:04d}"
+
+
+class StreamingWorksheet:
+    """ws.cell()-style writer over an openpyxl write-only sheet
+
+    The report builders fill rows in order through ws.cell(row=, column=,
+    value=); this keeps only the current row in memory and appends it to the
+    sheet once a later row is started, so the workbook streams to disk
+    instead of holding every cell. Call close() after the last row.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.rows_written = 0
+        self.current_row = 0
+        self.row_cells = {}
+
+    def cell(self, row, column, value=None):
+        if row != self.current_row:
+            if row < self.current_row:
+                raise ValueError(f"Row {row} requested after row {self.current_row} was started")
+            self.close()
+            self.current_row = row
+
+        cell = self.row_cells.get(column)
+        if cell is None:
+            cell = WriteOnlyCell(self.ws, value=value)
+            self.row_cells[column] = cell
+        elif value is not None:
+            cell.value = value
+        return cell
+
+    def close(self):
+        """Append the buffered row (and any skipped empty rows before it)"""
+        if not self.row_cells:
+            return
+        # Keep sheet row numbers in step with the builders' row counters
+        while self.rows_written < self.current_row - 1:
+            self.ws.append([])
+            self.rows_written += 1
+        self.ws.append([self.row_cells.get(column) for column in range(1, max(self.row_cells) + 1)])
+        self.rows_written = self.current_row
+        self.row_cells = {}
+
 
 class NoBreaksReportGenerator:
     def __init__(self):
         # Use parallel API for much faster processing
         self.sesame_api = ParallelSesameAPI()
-        # Create a regular SesameAPI instance for collections mapping
-        self.regular_api = SesameAPI()
-        self.logger = logging.getLogger(__name__)
+        # Regular client for collections mapping and employee filters; the shared
+        # one, so reports reuse its pooled connections instead of opening their own
+        self.regular_api = get_shared_api()
+        if (self.regular_api.token, self.regular_api.base_url) != (self.sesame_api.token, self.sesame_api.base_url):
+            # The token changed between the two lookups; every request of a
+            # report must use the same token, so use a client of its own
+            self.regular_api = SesameAPI()
+        self.logger = logger
+        # Created on first use; activity names are memoized for the life of the report
+        self._check_types_service = None
+        self._activity_names = {}
 
     def generate_report(self, from_date: Optional[str] = None, to_date: Optional[str] = None, 
                        employee_id: Optional[str] = None, office_id: Optional[str] = None, 
                        department_id: Optional[str] = None, report_type: str = "by_employee", 
-                       format: str = "xlsx", progress_callback = None) -> Optional[bytes]:
-        """Generate report with only work entries - no employee data processing"""
+                       format: str = "xlsx", progress_callback = None,
+                       output = None) -> Union[bytes, bool, None]:
+        """Generate report with only work entries - no employee data processing
+
+        When a binary file object is passed as output the report is written
+        straight into it and True is returned instead of the report bytes.
+        """
         
         try:
             self.logger.info(f"[REPORT] Starting report generation - from_date: {from_date}, to_date: {to_date}, report_type: {report_type}, format: {format}")
             
             # Ensure check types are cached
-            from services.check_types_service import CheckTypesService
-            check_types_service = CheckTypesService()
             self.logger.info("[REPORT] Ensuring check types are cached...")
-            if not check_types_service.ensure_check_types_cached():
+            if not self._get_check_types_service().ensure_check_types_cached():
                 self.logger.warning("Failed to cache check types, activity names may be incomplete")
             
-            # Get check type collections mapping
+            # The collections mapping and the office/department employee filter
+            # don't depend on the work entries, so they are fetched while the
+            # work-entry pages download instead of before and after them
             self.logger.info("[REPORT] Fetching check type collections mapping...")
-            collections_mapping = self.regular_api.get_all_check_type_collections_mapping()
+            lookups = ThreadPoolExecutor(max_workers=2)
+            try:
+                collections_future = lookups.submit(self.regular_api.get_all_check_type_collections_mapping)
+                employee_ids_future = None
+                if office_id or department_id:
+                    employee_ids_future = lookups.submit(
+                        self.regular_api.get_employee_ids, office_id=office_id, department_id=department_id)
+                
+                all_work_entries = self._fetch_work_entries(employee_id, from_date, to_date, progress_callback)
+                
+                collections_mapping = collections_future.result()
+                allowed_employee_ids = employee_ids_future.result() if employee_ids_future else None
+            finally:
+                lookups.shutdown(wait=False, cancel_futures=True)
             self.logger.info(f"[REPORT] Collections mapping obtained with {len(collections_mapping)} check types")
             
-            all_work_entries = []
-            page = 1
-            max_safe_pages = 100  # Limite aumentado para 10,000 registros
-            
-            self.logger.info(f"[REPORT] Starting work entries retrieval, max pages: {max_safe_pages}")
-            
-            while page <= max_safe_pages:
-                try:
-                    self.logger.info(f"[REPORT] Fetching page {page}...")
-                    response = self.sesame_api.get_time_tracking(
-                        employee_id=employee_id,
-                        from_date=from_date,
-                        to_date=to_date,
-                        page=page,
-                        limit=500
-                    )
-                    self.logger.info(f"[REPORT] Response received for page {page}")
-                    
-                    if not response or not response.get('data'):
-                        break
-                    
-                    entries = response['data']
-                    all_work_entries.extend(entries)
-                    
-                    # Verificar si hay más páginas
-                    meta = response.get('meta', {})
-                    total_pages = meta.get('lastPage', 1)
-                    total_records = meta.get('total', 0)
-                    self.logger.info(f"[REPORT] Página {page} de {total_pages} - Registros en esta página: {len(entries)} - Total acumulado: {len(all_work_entries)} de {total_records}")
-                    
-                    # Call progress callback if provided
-                    if progress_callback:
-                        progress_callback(page, total_pages, len(all_work_entries), total_records)
-                    
-                    if page >= meta.get('lastPage', 1):
-                        break
-                    
-                    # Si no hay suficientes registros, terminamos
-                    if len(entries) < 500:
-                        break
-                    
-                    page += 1
-                    
-                except Exception as e:
-                    self.logger.error(f"Error en página {page}: {str(e)}")
-                    if page == 1:
-                        # Si falla la primera página, es un error crítico
-                        raise e
-                    else:
-                        # Si falla una página posterior, continuamos con lo que tenemos
-                        self.logger.warning(f"Continuando con {len(all_work_entries)} registros obtenidos hasta página {page-1}")
-                        break
+            # Work entries can't be filtered by office/department, so ask the
+            # employees endpoint which employees match and keep only theirs
+            if all_work_entries and employee_ids_future:
+                if allowed_employee_ids is None:
+                    self.logger.warning("[REPORT] Could not load employees for office/department filter, skipping it")
+                else:
+                    all_work_entries = [
+                        entry for entry in all_work_entries
+                        if entry.get('employee', {}).get('id') in allowed_employee_ids
+                    ]
+                    self.logger.info(f"[REPORT] Office/department filter kept {len(all_work_entries)} entries")
             
             if not all_work_entries:
-                return self._create_empty_report(format)
+                return self._create_empty_report(format, output)
+
+            self._normalize_entries(all_work_entries)
+            self._warm_up_activity_names(all_work_entries)
 
             self.logger.info(f"[REPORT] API pagination completed - Total entries retrieved: {len(all_work_entries)}")
             self.logger.info("[REPORT] Starting report processing...")
             
             # Generate report based on format
             if format.lower() == "csv":
-                return self._generate_csv_report(all_work_entries, collections_mapping, report_type)
+                return self._generate_csv_report(all_work_entries, collections_mapping, report_type, output)
             else:
-                return self._generate_xlsx_report(all_work_entries, collections_mapping, report_type)
+                return self._generate_xlsx_report(all_work_entries, collections_mapping, report_type, output)
             
         except Exception as e:
             self.logger.error(f"Error generating report: {str(e)}")
-            return self._create_error_report(str(e), format)
+            return self._create_error_report(str(e), format, output)
+
+    def _fetch_work_entries(self, employee_id, from_date, to_date, progress_callback=None) -> List[Dict]:
+        """Download every work-entry page, reporting progress after each one"""
+        all_work_entries = []
+        max_safe_pages = 100  # Limite aumentado para 10,000 registros
+        
+        self.logger.info(f"[REPORT] Starting work entries retrieval, max pages: {max_safe_pages}")
+        
+        pages = self.sesame_api.iter_time_tracking_pages(
+            employee_id=employee_id,
+            from_date=from_date,
+            to_date=to_date,
+            limit=500,
+            max_pages=max_safe_pages
+        )
+        page = 0
+        try:
+            for page, response in enumerate(pages, 1):
+                entries = response['data']
+                all_work_entries.extend(entries)
+                
+                meta = response.get('meta', {})
+                total_pages = meta.get('lastPage', 1)
+                total_records = meta.get('total', 0)
+                self.logger.info(f"[REPORT] Página {page} de {total_pages} - Registros en esta página: {len(entries)} - Total acumulado: {len(all_work_entries)} de {total_records}")
+                
+                # Call progress callback if provided
+                if progress_callback:
+                    progress_callback(page, total_pages, len(all_work_entries), total_records)
+        except Exception as e:
+            self.logger.error(f"Error en página {page + 1}: {str(e)}")
+            if page == 0:
+                # Si falla la primera página, es un error crítico
+                raise e
+            # Si falla una página posterior, continuamos con lo que tenemos
+            self.logger.warning(f"Continuando con {len(all_work_entries)} registros obtenidos hasta página {page}")
+        
+        return all_work_entries
+
+    def _save_workbook(self, wb, output=None):
+        """Save a workbook into output, or return its bytes when no output is given"""
+        if output is not None:
+            wb.save(output)
+            return True
+        
+        buffer = BytesIO()
+        wb.save(buffer)
+        return buffer.getvalue()
 
-    def _generate_xlsx_report(self, all_work_entries, collections_mapping, report_type):
+    def _open_csv_output(self, output=None):
+        """Get the text stream a csv.writer should write into"""
+        if output is not None:
+            # Encode straight into the target file; utf-8-sig adds the BOM Excel needs
+            return TextIOWrapper(output, encoding='utf-8-sig', newline='')
+        return StringIO()
+
+    def _close_csv_output(self, text_output, output=None):
+        """Finish a stream from _open_csv_output and return the generate_report result"""
+        if output is not None:
+            text_output.flush()
+            # Detach so the caller's file object stays open
+            text_output.detach()
+            return True
+        
+        csv_content = text_output.getvalue()
+        text_output.close()
+        return csv_content.encode('utf-8-sig')  # UTF-8 BOM for Excel compatibility
+
+    def _generate_xlsx_report(self, all_work_entries, collections_mapping, report_type, output=None):
         """Generate XLSX report"""
-        wb = openpyxl.Workbook()
-        ws = wb.active
+        # Write-only workbook: rows are streamed out instead of kept as cells
+        wb = openpyxl.Workbook(write_only=True)
         
         # Set title based on report type
         if report_type == "by_group":
-            ws.title = "Grupos y tipos de registro"
+            ws = StreamingWorksheet(wb.create_sheet("Grupos y tipos de registro"))
         else:
-            ws.title = "Reporte Fichajes"
+            ws = StreamingWorksheet(wb.create_sheet("Reporte Fichajes"))
         
         # Headers based on report type
         if report_type == "by_group":
@@ -123,10 +281,12 @@ class NoBreaksReportGenerator:
         else:
             headers = ["Empleado", "Tipo ID", "Nº ID", "Fecha", "Actividad", "Grupo", "Entrada", "Salida", "Tiempo Registrado"]
         
+        # One named style registered on this workbook, referenced by every header
+        # cell, instead of new Font/PatternFill objects per cell
+        header_style = NamedStyle(name="report_header", font=_HEADER_FONT, fill=_HEADER_FILL)
+        wb.add_named_style(header_style)
         for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+            ws.cell(row=1, column=col, value=header).style = header_style.name
         
         current_row = 2
         
@@ -138,99 +298,93 @@ class NoBreaksReportGenerator:
         else:  # by_employee (default)
             current_row = self._process_grouped_entries(ws, all_work_entries, collections_mapping, current_row)
         
-        # Save to BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output.getvalue()
+        ws.close()
+        return self._save_workbook(wb, output)
 
-    def _generate_csv_report(self, all_work_entries, collections_mapping, report_type):
+    def _generate_csv_report(self, all_work_entries, collections_mapping, report_type, output=None):
         """Generate CSV report"""
-        output = StringIO()
-        writer = csv.writer(output)
+        text_output = self._open_csv_output(output)
+        writer = csv.writer(text_output)
         
         # Headers based on report type
         if report_type == "by_group":
             headers = ["Grupo", "Actividad", "Fecha", "Empleado", "Tipo de identificación", "Nº de identificación", "Entrada", "Salida", "Tiempo registrado"]
         else:
             headers = ["Empleado", "Tipo ID", "Nº ID", "Fecha", "Actividad", "Grupo", "Entrada", "Salida", "Tiempo Registrado"]
-        writer.writerow(headers)
-        
-        # Process entries based on report type
-        if report_type == "by_activity":
-            self._process_grouped_by_activity_csv(writer, all_work_entries, collections_mapping)
-        elif report_type == "by_group":
-            self._process_grouped_by_group_csv(writer, all_work_entries, collections_mapping)
-        else:  # by_employee (default)
-            self._process_grouped_entries_csv(writer, all_work_entries, collections_mapping)
-        
-        # Convert to bytes
-        csv_content = output.getvalue()
-        output.close()
-        return csv_content.encode('utf-8-sig')  # UTF-8 BOM for Excel compatibility
+        try:
+            writer.writerow(headers)
+            
+            # Process entries based on report type
+            if report_type == "by_activity":
+                self._process_grouped_by_activity_csv(writer, all_work_entries, collections_mapping)
+            elif report_type == "by_group":
+                self._process_grouped_by_group_csv(writer, all_work_entries, collections_mapping)
+            else:  # by_employee (default)
+                self._process_grouped_entries_csv(writer, all_work_entries, collections_mapping)
+        except Exception:
+            # Release the caller's file before the error report reuses it; a
+            # wrapper left to the garbage collector would flush stale rows
+            # after the error row and close the file
+            if output is not None:
+                text_output.detach()
+            raise
+        
+        return self._close_csv_output(text_output, output)
 
-    def _create_empty_report(self, format: str = "xlsx") -> bytes:
+    def _create_empty_report(self, format: str = "xlsx", output=None) -> Union[bytes, bool]:
         """Create an empty report when no data is found"""
         if format.lower() == "csv":
-            output = StringIO()
-            writer = csv.writer(output)
+            text_output = self._open_csv_output(output)
+            writer = csv.writer(text_output)
             writer.writerow(["No se encontraron datos para los filtros especificados"])
-            csv_content = output.getvalue()
-            output.close()
-            return csv_content.encode('utf-8-sig')
+            return self._close_csv_output(text_output, output)
         else:
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Reporte Vacío"
-            
-            ws.cell(row=1, column=1, value="No se encontraron datos para los filtros especificados")
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet("Reporte Vacío")
+            ws.append(["No se encontraron datos para los filtros especificados"])
             
-            output = BytesIO()
-            wb.save(output)
-            output.seek(0)
-            return output.getvalue()
+            return self._save_workbook(wb, output)
 
-    def _create_error_report(self, error_message: str, format: str = "xlsx") -> bytes:
+    def _create_error_report(self, error_message: str, format: str = "xlsx", output=None) -> Union[bytes, bool]:
         """Create an error report"""
+        if output is not None:
+            # Drop whatever was written before the failure
+            output.seek(0)
+            output.truncate()
+        
         if format.lower() == "csv":
-            output = StringIO()
-            writer = csv.writer(output)
+            text_output = self._open_csv_output(output)
+            writer = csv.writer(text_output)
             writer.writerow([f"Error al generar reporte: {error_message}"])
-            csv_content = output.getvalue()
-            output.close()
-            return csv_content.encode('utf-8-sig')
+            return self._close_csv_output(text_output, output)
         else:
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Error"
-            
-            ws.cell(row=1, column=1, value=f"Error al generar reporte: {error_message}")
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet("Error")
+            ws.append([f"Error al generar reporte: {error_message}"])
             
-            output = BytesIO()
-            wb.save(output)
-            output.seek(0)
-            return output.getvalue()
+            return self._save_workbook(wb, output)
 
-    def _parse_datetime(self, date_str: str) -> Optional[datetime]:
-        """Parse datetime string from API"""
-        if not date_str:
-            return None
-        
-        try:
-            # Handle different datetime formats
-            if date_str.endswith('Z'):
-                date_str = date_str.replace('Z', '+00:00')
-            
-            return datetime.fromisoformat(date_str)
-        except Exception:
-            return None
+    def _get_check_types_service(self):
+        """Get the CheckTypesService shared by this report"""
+        if self._check_types_service is None:
+            self._check_types_service = CheckTypesService()
+        return self._check_types_service
 
-    def _get_employee_identification(self, employee: Dict) -> tuple:
-        """Extract employee identification type and number"""
-        identification_type = employee.get('identityNumberType', 'DNI')
-        identification_number = employee.get('nid', employee.get('id', 'No disponible'))
-        
-        return identification_type, identification_number
+    def _get_activity_name(self, work_entry_type: str, work_break_id: Optional[str]) -> str:
+        """Get activity name, resolving each (type, break) pair only once per report"""
+        key = (work_entry_type, work_break_id)
+        activity_name = self._activity_names.get(key)
+        if activity_name is None:
+            activity_name = self._get_check_types_service().get_activity_name(work_entry_type, work_break_id)
+            self._activity_names[key] = activity_name
+        return activity_name
+
+    def _warm_up_activity_names(self, entries: List[Dict]):
+        """Resolve the activity names of every entry up front, with one check types query"""
+        keys = {(entry.get('workEntryType', ''), entry.get('workBreakId')) for entry in entries}
+        keys.difference_update(self._activity_names)
+        if keys:
+            self._activity_names.update(self._get_check_types_service().get_activity_names(keys))
 
     def _redistribute_pause_time(self, entries: List[Dict]) -> List[Dict]:
         """Redistribute pause time by eliminating gaps and adjusting adjacent work entries"""
@@ -238,173 +392,108 @@ class NoBreaksReportGenerator:
             return entries
         
         processed_entries = []
-        i = 0
+        # Last work entry seen so far; tracked during the walk so each pause
+        # finds its predecessor without scanning back through the list
+        prev_entry = None
         
-        while i < len(entries):
-            entry = entries[i]
+        for entry in entries:
             work_entry_type = entry.get('workEntryType', '')
             
             if work_entry_type == 'pause':
-                # This is a pause entry - adjust adjacent work entries to eliminate gap
-                pause_start = self._get_entry_start_time(entry)
+                # This is a pause entry - adjust adjacent work entries to eliminate gap.
+                # The previous entry is only looked at when the pause has both times
                 pause_end = self._get_entry_end_time(entry)
                 
-                if pause_start and pause_end:
-                    # Find previous and next work entries
-                    prev_entry = self._find_previous_work_entry(entries, i)
-                    next_entry = self._find_next_work_entry(entries, i)
-                    
-                    if prev_entry:
-                        # PRIORITY: Always try to extend previous entry to cover the pause
-                        prev_start = self._get_entry_start_time(prev_entry)
-                        prev_end = self._get_entry_end_time(prev_entry)
-                        
-                        if prev_start and prev_end:
-                            # Extend previous entry to end of pause
-                            self._extend_entry_to_time(prev_entry, pause_end)
+                if (prev_entry and pause_end and self._get_entry_start_time(entry)
+                        and self._get_entry_start_time(prev_entry)
+                        and self._get_entry_end_time(prev_entry)):
+                    # PRIORITY: Always extend previous entry to the end of the pause
+                    self._extend_entry_to_time(prev_entry, pause_end)
                 
                 # Skip adding this pause entry to processed_entries
-                i += 1
                 continue
-            else:
-                # This is a work entry - add it to processed entries if not marked to skip
-                if not entry.get('_skip', False):
-                    processed_entries.append(entry)
-                i += 1
+            
+            prev_entry = entry
+            # This is a work entry - add it to processed entries if not marked to skip
+            if not entry.get('_skip', False):
+                processed_entries.append(entry)
         
         return processed_entries
 
-    def _get_entry_duration_seconds(self, entry: Dict) -> int:
-        """Get the duration of an entry in seconds"""
+    def _normalize_entries(self, entries: List[Dict]):
+        """Parse each entry's in/out timestamps once and keep them on the entry"""
+        parse_entry_date = self._parse_entry_date
+        for entry in entries:
+            entry['_in_dt'] = parse_entry_date(entry.get('workEntryIn'))
+            entry['_out_dt'] = parse_entry_date(entry.get('workEntryOut'))
+
+    def _parse_entry_date(self, work_entry_point: Optional[Dict]) -> Optional[datetime]:
+        """Parse the date of a workEntryIn/workEntryOut object"""
+        if not work_entry_point or not work_entry_point.get('date'):
+            return None
         try:
-            work_entry_in = entry.get('workEntryIn', {})
-            work_entry_out = entry.get('workEntryOut', {})
-            
-            if not work_entry_in.get('date') or not work_entry_out.get('date'):
-                return 0
-            
-            in_time = datetime.fromisoformat(work_entry_in['date'].replace('Z', '+00:00'))
-            out_time = datetime.fromisoformat(work_entry_out['date'].replace('Z', '+00:00'))
-            
-            duration = out_time - in_time
-            return int(duration.total_seconds())
-        except Exception as e:
-            self.logger.error(f"Error calculating entry duration: {e}")
-            return 0
+            # Memoized, with a fast path for the API's fixed layout
+            return parse_iso_datetime(work_entry_point['date'])
+        except (ValueError, TypeError) as e:
+            self.logger.error(f"Error parsing entry date: {e}")
+            return None
 
     def _get_entry_start_time(self, entry: Dict) -> Optional[datetime]:
         """Get the start time of an entry"""
+        if '_in_dt' in entry:
+            return entry['_in_dt']
         try:
             work_entry_in = entry.get('workEntryIn', {})
             if work_entry_in.get('date'):
-                return datetime.fromisoformat(work_entry_in['date'].replace('Z', '+00:00'))
+                return parse_iso_datetime(work_entry_in['date'])
         except Exception:
             pass
         return None
 
     def _get_entry_end_time(self, entry: Dict) -> Optional[datetime]:
         """Get the end time of an entry"""
+        if '_out_dt' in entry:
+            return entry['_out_dt']
         try:
             work_entry_out = entry.get('workEntryOut', {})
             if work_entry_out.get('date'):
-                return datetime.fromisoformat(work_entry_out['date'].replace('Z', '+00:00'))
+                return parse_iso_datetime(work_entry_out['date'])
         except Exception:
             pass
         return None
 
-    def _find_previous_work_entry(self, entries: List[Dict], pause_index: int) -> Optional[Dict]:
-        """Find the previous work entry before the pause"""
-        for i in range(pause_index - 1, -1, -1):
-            if entries[i].get('workEntryType', '') != 'pause':
-                return entries[i]
-        return None
-
-    def _find_next_work_entry(self, entries: List[Dict], pause_index: int) -> Optional[Dict]:
-        """Find the next work entry after the pause"""
-        for i in range(pause_index + 1, len(entries)):
-            if entries[i].get('workEntryType', '') != 'pause':
-                return entries[i]
-        return None
-
     def _extend_entry_to_time(self, entry: Dict, end_time: datetime):
         """Extend a work entry to end at the specified time and update worked seconds"""
         try:
-            work_entry_in = entry.get('workEntryIn', {})
             work_entry_out = entry.get('workEntryOut', {})
             
-            if work_entry_in and work_entry_in.get('date') and work_entry_out:
-                # Get the start time
-                start_time = datetime.fromisoformat(work_entry_in['date'].replace('Z', '+00:00'))
-                
+            start_time = self._get_entry_start_time(entry)
+            if start_time and work_entry_out:
                 # Update end time
                 work_entry_out['date'] = end_time.isoformat().replace('+00:00', 'Z')
+                entry['_out_dt'] = end_time
                 
-                # Update worked seconds to reflect the new duration
+                # Update worked seconds to reflect the new duration, in whole seconds;
+                # rows format it from there (see _format_seconds)
+                worked_seconds = int((end_time - start_time).total_seconds())
                 # Handle night shifts - if end_time appears before start_time, it's next day
-                if end_time < start_time:
-                    # Add 24 hours to end_time for calculation
-                    adjusted_end_time = end_time + timedelta(days=1)
-                    new_duration = adjusted_end_time - start_time
-                else:
-                    new_duration = end_time - start_time
-                
-                entry['workedSeconds'] = int(new_duration.total_seconds())
-                
-                # Format duration as HH:MM:SS
-                hours = int(new_duration.total_seconds() // 3600)
-                minutes = int((new_duration.total_seconds() % 3600) // 60)
-                seconds = int(new_duration.total_seconds() % 60)
-                duration_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                
-                # Commented out to reduce log noise - uncomment for debugging
-                # self.logger.debug(f"Extended entry: start {start_time.strftime('%H:%M:%S')}, new end {end_time.strftime('%H:%M:%S')}, new duration {duration_str} ({entry['workedSeconds']}s)")
+                if worked_seconds < 0:
+                    worked_seconds += 86400
+                entry['workedSeconds'] = worked_seconds
         except Exception as e:
             self.logger.error(f"Error extending entry to time: {e}")
 
-    def _move_entry_start_to_time(self, entry: Dict, start_time: datetime):
-        """Move a work entry to start at the specified time and update worked seconds"""
-        try:
-            work_entry_in = entry.get('workEntryIn', {})
-            work_entry_out = entry.get('workEntryOut', {})
-            
-            if work_entry_in:
-                # Update start time
-                work_entry_in['date'] = start_time.isoformat().replace('+00:00', 'Z')
-                
-                # Update worked seconds only if we have an end time
-                if work_entry_out and work_entry_out.get('date'):
-                    end_time = datetime.fromisoformat(work_entry_out['date'].replace('Z', '+00:00'))
-                    new_duration = end_time - start_time
-                    entry['workedSeconds'] = int(new_duration.total_seconds())
-
-        except Exception as e:
-            self.logger.error(f"Error moving entry start time: {e}")
-
-    def _extend_entry_by_duration(self, entry: Dict, duration_seconds: int):
-        """Extend a work entry by the specified duration"""
-        try:
-            work_entry_out = entry.get('workEntryOut', {})
-            if work_entry_out and work_entry_out.get('date'):
-                end_time = datetime.fromisoformat(work_entry_out['date'].replace('Z', '+00:00'))
-                new_end_time = end_time + timedelta(seconds=duration_seconds)
-                work_entry_out['date'] = new_end_time.isoformat().replace('+00:00', 'Z')
-        except Exception as e:
-            self.logger.error(f"Error extending entry by duration: {e}")
-
     def _get_entry_sort_key(self, entry: Dict):
         """Get sort key for chronological ordering by entry start time - handles night shifts"""
         try:
-            work_entry_in = entry.get('workEntryIn', {})
-            if work_entry_in and work_entry_in.get('date'):
-                # Parse the datetime and return it for sorting
-                parsed_time = datetime.fromisoformat(work_entry_in['date'].replace('Z', '+00:00'))
-                
+            parsed_time = self._get_entry_start_time(entry)
+            if parsed_time:
                 # For night shifts: if time is between 00:00 and 06:00, add 24 hours for proper sorting
                 # This ensures night shift entries (like 22:00, 23:00, 00:00, 01:00, 02:00) sort correctly
                 if parsed_time.hour >= 0 and parsed_time.hour <= 6:
                     # This is likely early morning of next day in a night shift
                     # Add 24 hours to make it sort after the previous night's entries
-                    sort_time = parsed_time + timedelta(hours=24)
+                    sort_time = parsed_time + _ONE_DAY
                     return sort_time
                 else:
                     return parsed_time
@@ -431,19 +520,18 @@ class NoBreaksReportGenerator:
             # Extract date from workEntryIn.date
             entry_date = "No disponible"
             if entry.get('workEntryIn') and entry['workEntryIn'].get('date'):
-                try:
-                    entry_datetime = datetime.fromisoformat(
-                        entry['workEntryIn']['date'].replace('Z', '+00:00'))
-                    entry_date = entry_datetime.strftime('%d/%m/%Y')
-                except Exception as e:
-                    self.logger.error(f"Error parsing entry date: {e}")
+                entry_datetime = self._get_entry_start_time(entry)
+                if entry_datetime:
+                    entry_date = _format_dmy(entry_datetime)
+                else:
                     entry_date = "Error en fecha"
             
             # Create group key by employee and date
-            group_key = f"{employee_id}_{entry_date}"
+            group_key = (employee_id, entry_date)
             
-            if group_key not in grouped_entries:
-                grouped_entries[group_key] = {
+            group = grouped_entries.get(group_key)
+            if group is None:
+                group = grouped_entries[group_key] = {
                     'employee_name': employee_name,
                     'employee_id': employee_id,
                     'employee_info': employee_info,
@@ -452,7 +540,7 @@ class NoBreaksReportGenerator:
                 }
             
             # Add ALL entries (work, pause, everything)
-            grouped_entries[group_key]['all_entries'].append(entry)
+            group['all_entries'].append(entry)
         
         # Sort groups by employee name and date
         sorted_groups = sorted(grouped_entries.values(), 
@@ -465,14 +553,12 @@ class NoBreaksReportGenerator:
             # Sort all entries chronologically by entry start time
             all_entries.sort(key=self._get_entry_sort_key)
             
-            # Process pause redistribution
+            # Process pause redistribution; it only moves end times and drops
+            # pauses, so the entries stay in the order sorted above
             processed_entries = self._redistribute_pause_time(all_entries)
             
-            # Sort processed entries again to ensure chronological order after pause redistribution
-            processed_entries.sort(key=self._get_entry_sort_key)
-            
             # Write processed entries to Excel (without pause entries)
-            daily_totals = {}
+            daily_totals = defaultdict(int)
             total_worked_seconds = 0
             
             for entry in processed_entries:
@@ -493,8 +579,6 @@ class NoBreaksReportGenerator:
                 activity_name = row_data['activity_name']
                 worked_seconds = row_data['worked_seconds']
                 
-                if activity_name not in daily_totals:
-                    daily_totals[activity_name] = 0
                 daily_totals[activity_name] += worked_seconds
                 total_worked_seconds += worked_seconds
                 
@@ -526,10 +610,7 @@ class NoBreaksReportGenerator:
         work_entry_type = entry.get('workEntryType', '')
         work_break_id = entry.get('workBreakId')
         
-        # Import here to avoid circular import
-        from services.check_types_service import CheckTypesService
-        check_types_service = CheckTypesService()
-        activity_name = check_types_service.get_activity_name(work_entry_type, work_break_id)
+        activity_name = self._get_activity_name(work_entry_type, work_break_id)
         
         # Get group name from collections mapping using workCheckTypeId
         work_check_type_id = entry.get('workCheckTypeId')
@@ -538,42 +619,29 @@ class NoBreaksReportGenerator:
             group_name = collections_mapping.get(work_check_type_id, "Sin Grupo")
             self.logger.debug(f"Work entry with check_type_id {work_check_type_id} mapped to group: {group_name}")
         
-        # Extract date from workEntryIn.date
+        # Extract date and times from workEntryIn and workEntryOut
         entry_date = "No disponible"
-        if entry.get('workEntryIn') and entry['workEntryIn'].get('date'):
-            try:
-                entry_datetime = datetime.fromisoformat(
-                    entry['workEntryIn']['date'].replace('Z', '+00:00'))
-                entry_date = entry_datetime.strftime('%d/%m/%Y')
-            except Exception as e:
-                self.logger.error(f"Error parsing entry date: {e}")
-                entry_date = "Error en fecha"
-        
-        # Extract times from workEntryIn and workEntryOut
         start_time = "No disponible"
         end_time = "No disponible"
         
         if entry.get('workEntryIn') and entry['workEntryIn'].get('date'):
             try:
-                start_datetime = datetime.fromisoformat(
-                    entry['workEntryIn']['date'].replace('Z', '+00:00'))
-                start_time = start_datetime.strftime('%H:%M:%S')
-            except Exception as e:
-                self.logger.error(f"Error parsing start time: {e}")
+                entry_date, start_time = _split_iso_datetime(entry['workEntryIn']['date'])
+            except ValueError as e:
+                self.logger.error(f"Error parsing entry date: {e}")
+                entry_date = "Error en fecha"
                 start_time = "Error en hora"
         
         if entry.get('workEntryOut') and entry['workEntryOut'].get('date'):
             try:
-                end_datetime = datetime.fromisoformat(
-                    entry['workEntryOut']['date'].replace('Z', '+00:00'))
-                end_time = end_datetime.strftime('%H:%M:%S')
-            except Exception as e:
+                _, end_time = _split_iso_datetime(entry['workEntryOut']['date'])
+            except ValueError as e:
                 self.logger.error(f"Error parsing end time: {e}")
                 end_time = "Error en hora"
         
         # Calculate duration
         worked_seconds = entry.get('workedSeconds', 0)
-        final_duration = self._format_duration(timedelta(seconds=worked_seconds))
+        final_duration = self._format_seconds(worked_seconds)
         
         return {
             'employee_name': employee_name,
@@ -599,7 +667,7 @@ class NoBreaksReportGenerator:
         # Create summary of activity types
         activity_summary = []
         for activity_name, seconds in daily_totals.items():
-            duration_str = self._format_duration(timedelta(seconds=seconds))
+            duration_str = self._format_seconds(seconds)
             activity_summary.append(f"{activity_name}: {duration_str}")
         
         # Join activity summary (limit to avoid Excel cell size issues)
@@ -608,62 +676,32 @@ class NoBreaksReportGenerator:
             activity_summary_str += f"; ... y {len(daily_totals) - 5} más"
         
         # Total duration
-        total_duration = self._format_duration(timedelta(seconds=total_worked_seconds))
-        
-        # Apply bold formatting for TOTAL row
-        total_font = Font(bold=True)
-        total_fill = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
+        total_duration = self._format_seconds(total_worked_seconds)
         
         # Write TOTAL row
-        ws.cell(row=current_row, column=1, value=employee_name).font = total_font
-        ws.cell(row=current_row, column=2, value=employee_id_type).font = total_font
-        ws.cell(row=current_row, column=3, value=employee_nid).font = total_font
-        ws.cell(row=current_row, column=4, value=entry_date).font = total_font
-        ws.cell(row=current_row, column=5, value="TOTAL").font = total_font
-        ws.cell(row=current_row, column=6, value="").font = total_font
-        ws.cell(row=current_row, column=7, value="").font = total_font
-        ws.cell(row=current_row, column=8, value="").font = total_font
-        ws.cell(row=current_row, column=9, value=total_duration).font = total_font
+        ws.cell(row=current_row, column=1, value=employee_name).font = _TOTAL_FONT
+        ws.cell(row=current_row, column=2, value=employee_id_type).font = _TOTAL_FONT
+        ws.cell(row=current_row, column=3, value=employee_nid).font = _TOTAL_FONT
+        ws.cell(row=current_row, column=4, value=entry_date).font = _TOTAL_FONT
+        ws.cell(row=current_row, column=5, value="TOTAL").font = _TOTAL_FONT
+        ws.cell(row=current_row, column=6, value="").font = _TOTAL_FONT
+        ws.cell(row=current_row, column=7, value="").font = _TOTAL_FONT
+        ws.cell(row=current_row, column=8, value="").font = _TOTAL_FONT
+        ws.cell(row=current_row, column=9, value=total_duration).font = _TOTAL_FONT
         
         # Apply background color to TOTAL row
         for col in range(1, 10):
-            ws.cell(row=current_row, column=col).fill = total_fill
+            ws.cell(row=current_row, column=col).fill = _TOTAL_FILL
         
         return current_row + 1
 
-    def _format_duration(self, duration):
-        """Format duration as HH:MM:SS - same as preview"""
-        if isinstance(duration, timedelta):
-            total_seconds = int(duration.total_seconds())
-        else:
-            total_seconds = int(duration)
-
-        hours = total_seconds // 3600
-        minutes = (total_seconds % 3600) // 60
-        seconds = total_seconds % 60
-
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    def _format_seconds(self, total_seconds):
+        """Format a number of seconds as HH:MM:SS without building a timedelta"""
+        return _format_hms(int(total_seconds))
 
     def _process_grouped_entries_csv(self, writer, all_work_entries, collections_mapping):
         """Process entries grouped by employee and date for CSV output"""
         # Reuse the Excel logic but write to CSV
-        import csv
-        from io import StringIO
-        
-        # Create a temporary workbook-like structure for reusing existing logic
-        class CSVRow:
-            def __init__(self, writer):
-                self.writer = writer
-                self.row_data = []
-            
-            def cell(self, row, column, value=None):
-                # Adjust row_data size if needed
-                while len(self.row_data) < column:
-                    self.row_data.append("")
-                if value is not None:
-                    self.row_data[column-1] = value
-                return self
-        
         # Create a mock worksheet that writes to CSV
         class CSVWorksheet:
             def __init__(self, writer):
@@ -684,33 +722,36 @@ class NoBreaksReportGenerator:
                     self.row_data[column-1] = str(value)
                 
                 return self
+            
+            def close(self):
+                # Write the last buffered row
+                if hasattr(self, 'row_data') and self.row_data:
+                    self.writer.writerow(self.row_data)
+                    self.row_data = []
         
         # Create CSV worksheet wrapper
         csv_ws = CSVWorksheet(writer)
         
         # Reuse existing Excel processing logic
-        current_row = self._process_grouped_entries(csv_ws, all_work_entries, collections_mapping, 1)
+        self._process_grouped_entries(csv_ws, all_work_entries, collections_mapping, 1)
+        csv_ws.close()
 
     def _process_grouped_by_activity_csv(self, writer, all_work_entries, collections_mapping):
         """Process entries grouped by activity type for CSV output"""
         # Group entries by activity type first
-        activity_groups = {}
+        activity_groups = defaultdict(list)
         
         for entry in all_work_entries:
             # Get activity name
             work_entry_type = entry.get('workEntryType', '')
             work_break_id = entry.get('workBreakId')
             
-            from services.check_types_service import CheckTypesService
-            check_types_service = CheckTypesService()
-            activity_name = check_types_service.get_activity_name(work_entry_type, work_break_id)
+            activity_name = self._get_activity_name(work_entry_type, work_break_id)
             
-            if activity_name not in activity_groups:
-                activity_groups[activity_name] = []
             activity_groups[activity_name].append(entry)
         
         # Process each activity group separately
-        for activity_name in sorted(activity_groups.keys()):
+        for activity_name in sorted(activity_groups):
             entries = activity_groups[activity_name]
             
             # Write activity header row
@@ -736,13 +777,9 @@ class NoBreaksReportGenerator:
             
             # Extract date from entry
             entry_date = "No disponible"
-            if entry.get('workEntryIn') and entry['workEntryIn'].get('date'):
-                try:
-                    entry_datetime = datetime.fromisoformat(
-                        entry['workEntryIn']['date'].replace('Z', '+00:00'))
-                    entry_date = entry_datetime.strftime('%d/%m/%Y')
-                except Exception as e:
-                    self.logger.error(f"Error parsing entry date: {e}")
+            entry_datetime = self._get_entry_start_time(entry)
+            if entry_datetime:
+                entry_date = _format_dmy(entry_datetime)
             
             # Store entry with its group name and date
             entries_with_groups.append({
@@ -760,29 +797,17 @@ class NoBreaksReportGenerator:
         
         entries_with_groups.sort(key=get_combined_sort_key)
         
-        # Group entries for pause redistribution by group AND date
-        grouped_entries = {}
-        for item in entries_with_groups:
-            group_key = f"{item['group_name']}_{item['entry_date']}"
-            if group_key not in grouped_entries:
-                grouped_entries[group_key] = {
-                    'group_name': item['group_name'],
-                    'entry_date': item['entry_date'],
-                    'entries': []
-                }
-            grouped_entries[group_key]['entries'].append(item['entry'])
-        
-        # Process each group/date combination for pause redistribution
+        # Entries are already sorted by group and date, so each group/date
+        # combination is a consecutive run - process pause redistribution per run
         all_processed_entries = []
-        for group_key, group_data in grouped_entries.items():
-            # Process pause redistribution for this group/date
-            processed_entries = self._redistribute_pause_time(group_data['entries'])
+        for (group_name, entry_date), items in groupby(entries_with_groups, key=_group_date_key):
+            processed_entries = self._redistribute_pause_time([item['entry'] for item in items])
             
             # Add group name and date to each processed entry
             for entry in processed_entries:
                 all_processed_entries.append({
-                    'group_name': group_data['group_name'],
-                    'entry_date': group_data['entry_date'],
+                    'group_name': group_name,
+                    'entry_date': entry_date,
                     'entry': entry
                 })
         
@@ -803,7 +828,7 @@ class NoBreaksReportGenerator:
             if current_group is not None and (current_group != group_name or current_date != entry_date):
                 # Add total row for the previous group/date combination
                 if group_date_total_seconds > 0:
-                    total_duration = self._format_duration(timedelta(seconds=group_date_total_seconds))
+                    total_duration = self._format_seconds(group_date_total_seconds)
                     
                     # Write TOTAL row
                     writer.writerow([
@@ -854,7 +879,7 @@ class NoBreaksReportGenerator:
         
         # Add final total for the last group/date if exists
         if current_group is not None and group_date_total_seconds > 0:
-            total_duration = self._format_duration(timedelta(seconds=group_date_total_seconds))
+            total_duration = self._format_seconds(group_date_total_seconds)
             
             # Write TOTAL row
             writer.writerow([
@@ -874,44 +899,26 @@ class NoBreaksReportGenerator:
                          department_id: Optional[str] = None) -> dict:
         """Get data collection metrics without generating full report"""
         try:
-            # Get all work entries
-            all_work_entries = self.sesame_api.get_all_time_tracking_data(
+            # Only the first 10 entries are previewed, so a single page is
+            # enough; the overall count comes from the pagination metadata
+            response = self.sesame_api.get_time_tracking(
                 employee_id=employee_id,
                 from_date=from_date,
-                to_date=to_date
-            )
-            
-            # Get check types mapping
-            check_types_response = self.sesame_api.get_check_types()
-            check_types_map = {}
-            if check_types_response and 'data' in check_types_response:
-                for check_type in check_types_response['data']:
-                    check_types_map[check_type['id']] = check_type['name']
+                to_date=to_date,
+                page=1,
+                limit=10
+            ) or {}
+            preview_work_entries = response.get('data') or []
+            total_entries = response.get('meta', {}).get('total', len(preview_work_entries))
             
             # Process first 10 entries for preview
-            preview_entries = []
-            for entry in all_work_entries[:10]:  # Only first 10 for preview
-                employee_info = entry.get('employee', {})
-                employee_name = f"{employee_info.get('firstName', '')} {employee_info.get('lastName', '')}".strip()
-                
-                if not employee_name:
-                    employee_name = "Empleado desconocido"
-                
-                # Extract date
-                entry_date = "No disponible"
-                if entry.get('workEntryIn') and entry['workEntryIn'].get('date'):
-                    try:
-                        entry_datetime = datetime.fromisoformat(
-                            entry['workEntryIn']['date'].replace('Z', '+00:00'))
-                        entry_date = entry_datetime.strftime('%Y-%m-%d')
-                    except Exception:
-                        entry_date = "Error en fecha"
-                
-                row_data = self._extract_entry_data(entry, employee_info)
-                preview_entries.append(row_data)
+            preview_entries = [
+                self._extract_entry_data(entry, entry.get('employee', {}))
+                for entry in preview_work_entries
+            ]
             
             return {
-                'total_entries': len(all_work_entries),
+                'total_entries': total_entries,
                 'preview_entries': preview_entries,
                 'success': True
             }
@@ -935,33 +942,29 @@ class NoBreaksReportGenerator:
             work_entry_type = entry.get('workEntryType', '')
             work_break_id = entry.get('workBreakId')
             
-            # Import here to avoid circular import
-            from services.check_types_service import CheckTypesService
-            check_types_service = CheckTypesService()
-            activity_name = check_types_service.get_activity_name(work_entry_type, work_break_id)
+            activity_name = self._get_activity_name(work_entry_type, work_break_id)
             
             # Extract date from workEntryIn.date
             entry_date = "No disponible"
             if entry.get('workEntryIn') and entry['workEntryIn'].get('date'):
-                try:
-                    entry_datetime = datetime.fromisoformat(
-                        entry['workEntryIn']['date'].replace('Z', '+00:00'))
-                    entry_date = entry_datetime.strftime('%d/%m/%Y')
-                except Exception as e:
-                    self.logger.error(f"Error parsing entry date: {e}")
+                entry_datetime = self._get_entry_start_time(entry)
+                if entry_datetime:
+                    entry_date = _format_dmy(entry_datetime)
+                else:
                     entry_date = "Error en fecha"
             
             # Create group key by activity and date
-            group_key = f"{activity_name}_{entry_date}"
+            group_key = (activity_name, entry_date)
             
-            if group_key not in grouped_entries:
-                grouped_entries[group_key] = {
+            group = grouped_entries.get(group_key)
+            if group is None:
+                group = grouped_entries[group_key] = {
                     'activity_name': activity_name,
                     'date': entry_date,
                     'all_entries': []
                 }
             
-            grouped_entries[group_key]['all_entries'].append(entry)
+            group['all_entries'].append(entry)
         
         # Sort groups by activity name and date
         sorted_groups = sorted(grouped_entries.values(), 
@@ -974,12 +977,10 @@ class NoBreaksReportGenerator:
             # Sort all entries chronologically by entry start time
             all_entries.sort(key=self._get_entry_sort_key)
             
-            # Process pause redistribution
+            # Process pause redistribution; it only moves end times and drops
+            # pauses, so the entries stay in the order sorted above
             processed_entries = self._redistribute_pause_time(all_entries)
             
-            # Sort processed entries again to ensure chronological order after pause redistribution
-            processed_entries.sort(key=self._get_entry_sort_key)
-            
             # Write processed entries to Excel (without pause entries)
             activity_totals = {}
             total_worked_seconds = 0
@@ -1028,13 +1029,9 @@ class NoBreaksReportGenerator:
             
             # Extract date from entry
             entry_date = "No disponible"
-            if entry.get('workEntryIn') and entry['workEntryIn'].get('date'):
-                try:
-                    entry_datetime = datetime.fromisoformat(
-                        entry['workEntryIn']['date'].replace('Z', '+00:00'))
-                    entry_date = entry_datetime.strftime('%d/%m/%Y')
-                except Exception as e:
-                    self.logger.error(f"Error parsing entry date: {e}")
+            entry_datetime = self._get_entry_start_time(entry)
+            if entry_datetime:
+                entry_date = _format_dmy(entry_datetime)
             
             # Store entry with its group name and date
             entries_with_groups.append({
@@ -1052,29 +1049,17 @@ class NoBreaksReportGenerator:
         
         entries_with_groups.sort(key=get_combined_sort_key)
         
-        # Group entries for pause redistribution by group AND date
-        grouped_entries = {}
-        for item in entries_with_groups:
-            group_key = f"{item['group_name']}_{item['entry_date']}"
-            if group_key not in grouped_entries:
-                grouped_entries[group_key] = {
-                    'group_name': item['group_name'],
-                    'entry_date': item['entry_date'],
-                    'entries': []
-                }
-            grouped_entries[group_key]['entries'].append(item['entry'])
-        
-        # Process each group/date combination for pause redistribution
+        # Entries are already sorted by group and date, so each group/date
+        # combination is a consecutive run - process pause redistribution per run
         all_processed_entries = []
-        for group_key, group_data in grouped_entries.items():
-            # Process pause redistribution for this group/date
-            processed_entries = self._redistribute_pause_time(group_data['entries'])
+        for (group_name, entry_date), items in groupby(entries_with_groups, key=_group_date_key):
+            processed_entries = self._redistribute_pause_time([item['entry'] for item in items])
             
             # Add group name and date to each processed entry
             for entry in processed_entries:
                 all_processed_entries.append({
-                    'group_name': group_data['group_name'],
-                    'entry_date': group_data['entry_date'],
+                    'group_name': group_name,
+                    'entry_date': entry_date,
                     'entry': entry
                 })
         
@@ -1095,26 +1080,22 @@ class NoBreaksReportGenerator:
             if current_group is not None and (current_group != group_name or current_date != entry_date):
                 # Add total row for the previous group/date combination
                 if group_date_total_seconds > 0:
-                    total_duration = self._format_duration(timedelta(seconds=group_date_total_seconds))
-                    
-                    # Apply bold formatting for TOTAL row
-                    total_font = Font(bold=True)
-                    total_fill = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
+                    total_duration = self._format_seconds(group_date_total_seconds)
                     
                     # Write TOTAL row with same format as data rows
-                    ws.cell(row=current_row, column=1, value=current_group).font = total_font
-                    ws.cell(row=current_row, column=2, value="TOTAL").font = total_font
-                    ws.cell(row=current_row, column=3, value=current_date).font = total_font
-                    ws.cell(row=current_row, column=4, value="").font = total_font
-                    ws.cell(row=current_row, column=5, value="").font = total_font
-                    ws.cell(row=current_row, column=6, value="").font = total_font
-                    ws.cell(row=current_row, column=7, value="").font = total_font
-                    ws.cell(row=current_row, column=8, value="").font = total_font
-                    ws.cell(row=current_row, column=9, value=total_duration).font = total_font
+                    ws.cell(row=current_row, column=1, value=current_group).font = _TOTAL_FONT
+                    ws.cell(row=current_row, column=2, value="TOTAL").font = _TOTAL_FONT
+                    ws.cell(row=current_row, column=3, value=current_date).font = _TOTAL_FONT
+                    ws.cell(row=current_row, column=4, value="").font = _TOTAL_FONT
+                    ws.cell(row=current_row, column=5, value="").font = _TOTAL_FONT
+                    ws.cell(row=current_row, column=6, value="").font = _TOTAL_FONT
+                    ws.cell(row=current_row, column=7, value="").font = _TOTAL_FONT
+                    ws.cell(row=current_row, column=8, value="").font = _TOTAL_FONT
+                    ws.cell(row=current_row, column=9, value=total_duration).font = _TOTAL_FONT
                     
                     # Apply background color to TOTAL row
                     for col in range(1, 10):
-                        ws.cell(row=current_row, column=col).fill = total_fill
+                        ws.cell(row=current_row, column=col).fill = _TOTAL_FILL
                     
                     current_row += 1
                     # Add a blank row after total
@@ -1153,26 +1134,22 @@ class NoBreaksReportGenerator:
         
         # Add final total for the last group/date if exists
         if current_group is not None and group_date_total_seconds > 0:
-            total_duration = self._format_duration(timedelta(seconds=group_date_total_seconds))
-            
-            # Apply bold formatting for TOTAL row
-            total_font = Font(bold=True)
-            total_fill = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
+            total_duration = self._format_seconds(group_date_total_seconds)
             
             # Write TOTAL row
-            ws.cell(row=current_row, column=1, value=current_group).font = total_font
-            ws.cell(row=current_row, column=2, value="TOTAL").font = total_font
-            ws.cell(row=current_row, column=3, value=current_date).font = total_font
-            ws.cell(row=current_row, column=4, value="").font = total_font
-            ws.cell(row=current_row, column=5, value="").font = total_font
-            ws.cell(row=current_row, column=6, value="").font = total_font
-            ws.cell(row=current_row, column=7, value="").font = total_font
-            ws.cell(row=current_row, column=8, value="").font = total_font
-            ws.cell(row=current_row, column=9, value=total_duration).font = total_font
+            ws.cell(row=current_row, column=1, value=current_group).font = _TOTAL_FONT
+            ws.cell(row=current_row, column=2, value="TOTAL").font = _TOTAL_FONT
+            ws.cell(row=current_row, column=3, value=current_date).font = _TOTAL_FONT
+            ws.cell(row=current_row, column=4, value="").font = _TOTAL_FONT
+            ws.cell(row=current_row, column=5, value="").font = _TOTAL_FONT
+            ws.cell(row=current_row, column=6, value="").font = _TOTAL_FONT
+            ws.cell(row=current_row, column=7, value="").font = _TOTAL_FONT
+            ws.cell(row=current_row, column=8, value="").font = _TOTAL_FONT
+            ws.cell(row=current_row, column=9, value=total_duration).font = _TOTAL_FONT
             
             # Apply background color to TOTAL row
             for col in range(1, 10):
-                ws.cell(row=current_row, column=col).fill = total_fill
+                ws.cell(row=current_row, column=col).fill = _TOTAL_FILL
             
             current_row += 1
         
@@ -1184,53 +1161,21 @@ class NoBreaksReportGenerator:
         entry_date = group['date']
         
         # Total duration
-        total_duration = self._format_duration(timedelta(seconds=total_worked_seconds))
-        
-        # Apply bold formatting for TOTAL row
-        total_font = Font(bold=True)
-        total_fill = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
+        total_duration = self._format_seconds(total_worked_seconds)
         
         # Write TOTAL row
-        ws.cell(row=current_row, column=1, value="TOTAL").font = total_font
-        ws.cell(row=current_row, column=2, value="").font = total_font
-        ws.cell(row=current_row, column=3, value="").font = total_font
-        ws.cell(row=current_row, column=4, value=entry_date).font = total_font
-        ws.cell(row=current_row, column=5, value=activity_name).font = total_font
-        ws.cell(row=current_row, column=6, value="").font = total_font
-        ws.cell(row=current_row, column=7, value="").font = total_font
-        ws.cell(row=current_row, column=8, value="").font = total_font
-        ws.cell(row=current_row, column=9, value=total_duration).font = total_font
+        ws.cell(row=current_row, column=1, value="TOTAL").font = _TOTAL_FONT
+        ws.cell(row=current_row, column=2, value="").font = _TOTAL_FONT
+        ws.cell(row=current_row, column=3, value="").font = _TOTAL_FONT
+        ws.cell(row=current_row, column=4, value=entry_date).font = _TOTAL_FONT
+        ws.cell(row=current_row, column=5, value=activity_name).font = _TOTAL_FONT
+        ws.cell(row=current_row, column=6, value="").font = _TOTAL_FONT
+        ws.cell(row=current_row, column=7, value="").font = _TOTAL_FONT
+        ws.cell(row=current_row, column=8, value="").font = _TOTAL_FONT
+        ws.cell(row=current_row, column=9, value=total_duration).font = _TOTAL_FONT
         
         # Apply background color to TOTAL row
         for col in range(1, 10):
-            ws.cell(row=current_row, column=col).fill = total_fill
+            ws.cell(row=current_row, column=col).fill = _TOTAL_FILL
         
         return current_row + 1
-
-    def _add_group_total_row(self, ws, group, total_worked_seconds, current_row):
-        """Add TOTAL row for group"""
-        group_name = group['group_name']
-        
-        # Total duration
-        total_duration = self._format_duration(timedelta(seconds=total_worked_seconds))
-        
-        # Apply bold formatting for TOTAL row
-        total_font = Font(bold=True)
-        total_fill = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
-        
-        # Write TOTAL row (columns: Grupo, Actividad, Fecha, Empleado, Tipo Doc, NID, Entrada, Salida, Duración)
-        ws.cell(row=current_row, column=1, value=group_name).font = total_font
-        ws.cell(row=current_row, column=2, value="TOTAL").font = total_font
-        ws.cell(row=current_row, column=3, value="").font = total_font
-        ws.cell(row=current_row, column=4, value="").font = total_font
-        ws.cell(row=current_row, column=5, value="").font = total_font
-        ws.cell(row=current_row, column=6, value="").font = total_font
-        ws.cell(row=current_row, column=7, value="").font = total_font
-        ws.cell(row=current_row, column=8, value="").font = total_font
-        ws.cell(row=current_row, column=9, value=total_duration).font = total_font
-        
-        # Apply background color to TOTAL row
-        for col in range(1, 10):
-            ws.cell(row=current_row, column=col).fill = total_fill
-        
-        return current_row + 1
\ No newline at end of file
@@ -1,13 +1,15 @@
 import requests
 import logging
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from models import SesameToken, db
 import time
 
+logger = logging.getLogger(__name__)
+
 class ParallelSesameAPI:
     def __init__(self):
-        self.logger = logging.getLogger(__name__)
+        self.logger = logger
         self.token = None
         self.base_url = None
         self._get_token_and_region()
@@ -95,7 +97,7 @@ class ParallelSesameAPI:
                          page: int = 1,
                          limit: int = 500) -> Optional[Dict]:
         """Get work entries (time tracking data)"""
-        params: Dict[str, any] = {"page": page, "limit": limit}
+        params: Dict[str, Any] = {"page": page, "limit": limit}
 
         if employee_id:
             params["employeeId"] = employee_id
@@ -120,6 +122,53 @@ class ParallelSesameAPI:
         return self.get_work_entries(employee_id, company_id, from_date,
                                      to_date, page, limit)
 
+    def iter_time_tracking_pages(self,
+                                 employee_id: Optional[str] = None,
+                                 company_id: Optional[str] = None,
+                                 from_date: Optional[str] = None,
+                                 to_date: Optional[str] = None,
+                                 limit: int = 500,
+                                 max_pages: int = 100,
+                                 max_workers: int = 5) -> Iterator[Dict]:
+        """Yield work-entries responses page by page, stopping after the last page
+
+        The first page tells how many pages there are; the rest are fetched
+        concurrently and still yielded in page order.
+        """
+        def fetch(page):
+            return self.get_time_tracking(
+                employee_id=employee_id,
+                company_id=company_id,
+                from_date=from_date,
+                to_date=to_date,
+                page=page,
+                limit=limit)
+
+        response = fetch(1)
+        if not response or not response.get("data"):
+            return
+
+        yield response
+
+        last_page = min(response.get("meta", {}).get("lastPage", 1), max_pages)
+        if last_page <= 1 or len(response["data"]) < limit:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, last_page - 1))
+        try:
+            futures = [executor.submit(fetch, page) for page in range(2, last_page + 1)]
+            for future in futures:
+                response = future.result()
+                if not response or not response.get("data"):
+                    return
+
+                yield response
+
+                if len(response["data"]) < limit:
+                    return
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def get_check_types(self,
                        page: int = 1,
                        limit: int = 100) -> Optional[Dict]:
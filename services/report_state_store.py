@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class ReportStateStore:
+    """In-process store for background report state with time-based expiry
+
+    At most max_reports entries are kept; storing a new report beyond that
+    drops the least recently used ones. When evictable_statuses is given only
+    reports in one of those statuses are dropped, so reports still being
+    generated are kept even if that means going over max_reports.
+
+    Every report has a version, bumped on each change, and its own condition
+    so a waiter for one report is only woken by changes to that report.
+    """
+
+    def __init__(self, ttl_seconds: int = 86400, max_reports: int = 128,
+                 evictable_statuses: Optional[Iterable[str]] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_reports = max_reports
+        self.evictable_statuses = frozenset(evictable_statuses) if evictable_statuses is not None else None
+        # Least recently used first
+        self._reports: "OrderedDict[str, Dict]" = OrderedDict()
+        self._expires_at: Dict[str, float] = {}
+        self._versions: Dict[str, int] = {}
+        self._changed: Dict[str, threading.Condition] = {}
+        self._lock = threading.Lock()
+
+    def put(self, report_id: str, state: Dict):
+        """Store the state of a report, (re)starting its expiry"""
+        with self._lock:
+            self._reports[report_id] = dict(state)
+            self._reports.move_to_end(report_id)
+            self._expires_at[report_id] = time.monotonic() + self.ttl_seconds
+            self._versions[report_id] = self._versions.get(report_id, 0) + 1
+            changed = self._changed.setdefault(report_id, threading.Condition())
+            self._evict_over_limit(keep=report_id)
+        with changed:
+            changed.notify_all()
+
+    def get(self, report_id: str) -> Optional[Dict]:
+        """Get a copy of the state of a report, or None if unknown or expired"""
+        return self.get_versioned(report_id)[0]
+
+    def get_versioned(self, report_id: str) -> Tuple[Optional[Dict], Optional[int]]:
+        """Get a copy of the state of a report and its version, or (None, None)"""
+        with self._lock:
+            if self._is_expired(report_id):
+                self._remove(report_id)
+            report = self._reports.get(report_id)
+            if report is None:
+                return None, None
+            self._reports.move_to_end(report_id)
+            return dict(report), self._versions[report_id]
+
+    def update(self, report_id: str, expected_status: Optional[str] = None, **changes) -> bool:
+        """Apply changes to a stored report as one step
+
+        With expected_status the changes are only applied while the report is
+        still in that status. Returns False if nothing was applied.
+        """
+        with self._lock:
+            report = self._reports.get(report_id)
+            if report is None:
+                return False
+            if expected_status is not None and report.get('status') != expected_status:
+                return False
+            report.update(changes)
+            self._reports.move_to_end(report_id)
+            self._versions[report_id] += 1
+            changed = self._changed[report_id]
+            # A report that just finished may be what lets the store shrink back
+            self._evict_over_limit(keep=report_id)
+        with changed:
+            changed.notify_all()
+        return True
+
+    def wait_for_change(self, report_id: str, version: int, timeout: float) -> bool:
+        """Block until the report moves past version (or is removed); False on timeout"""
+        with self._lock:
+            changed = self._changed.get(report_id)
+            if changed is None or self._versions.get(report_id) != version:
+                return True
+        with changed:
+            return changed.wait_for(lambda: self._current_version(report_id) != version, timeout)
+
+    def delete(self, report_id: str):
+        """Forget a report"""
+        with self._lock:
+            changed = self._changed.get(report_id)
+            self._remove(report_id)
+        if changed is not None:
+            with changed:
+                changed.notify_all()
+
+    def items(self) -> List[Tuple[str, Dict]]:
+        """Snapshot of all live reports as (report_id, state) pairs"""
+        self.purge_expired()
+        with self._lock:
+            return [(report_id, dict(report)) for report_id, report in self._reports.items()]
+
+    def purge_expired(self) -> int:
+        """Drop expired reports, returning how many were removed"""
+        with self._lock:
+            expired = [report_id for report_id in self._reports if self._is_expired(report_id)]
+            for report_id in expired:
+                self._remove(report_id)
+            return len(expired)
+
+    def __contains__(self, report_id: str) -> bool:
+        return self.get(report_id) is not None
+
+    def _current_version(self, report_id: str) -> Optional[int]:
+        with self._lock:
+            return self._versions.get(report_id)
+
+    def _evict_over_limit(self, keep: str):
+        """Drop least recently used evictable reports while over max_reports
+
+        The report just stored or updated (keep) is never dropped, so its
+        caller can still read the state it wrote.
+        """
+        excess = len(self._reports) - self.max_reports
+        if excess <= 0:
+            return
+        if self.evictable_statuses is None:
+            for _ in range(excess):
+                evicted_id, _ = self._reports.popitem(last=False)
+                self._remove(evicted_id)
+            return
+        evictable = (report_id for report_id, report in self._reports.items()
+                     if report_id != keep and report.get('status') in self.evictable_statuses)
+        for evicted_id in list(islice(evictable, excess)):
+            self._remove(evicted_id)
+
+    def _is_expired(self, report_id: str) -> bool:
+        expires_at = self._expires_at.get(report_id)
+        return expires_at is not None and expires_at <= time.monotonic()
+
+    def _remove(self, report_id: str):
+        self._reports.pop(report_id, None)
+        self._expires_at.pop(report_id, None)
+        self._versions.pop(report_id, None)
+        self._changed.pop(report_id, None)
@@ -0,0 +1,101 @@
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ReportsIndex:
+    """SQLite index of the report files kept in temp_reports
+
+    Listing and evicting reports become indexed queries instead of a glob and
+    a stat() per file. The index lives next to the files it describes, so it
+    is shared by every worker serving that directory.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    id TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection (sqlite3 connections can't be shared across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, report_id: str, path: str, filename: str, size: int, created_at: datetime) -> int:
+        """Record a report file, returning how many reports are indexed afterwards"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports (id, path, filename, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                (report_id, path, filename, size, created_at.isoformat()))
+            return conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def get(self, report_id: str) -> Optional[Dict]:
+        """Get a report by id"""
+        row = self._connect().execute("SELECT * FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self) -> List[Dict]:
+        """All reports, newest first"""
+        rows = self._connect().execute("SELECT * FROM reports ORDER BY created_at DESC").fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def beyond_limit(self, max_reports: int) -> List[Dict]:
+        """Reports past the newest max_reports, oldest first"""
+        rows = self._connect().execute(
+            "SELECT * FROM reports ORDER BY created_at ASC LIMIT max(0, (SELECT COUNT(*) FROM reports) - ?)",
+            (max_reports,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def remove(self, report_id: str):
+        """Forget a report"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+
+    def remove_many(self, report_ids: Iterable[str]):
+        """Forget several reports in one transaction"""
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM reports WHERE id = ?", [(report_id,) for report_id in report_ids])
+
+    def sync(self, reports: Iterable[Dict]):
+        """Bring the index in line with the given report files (e.g. a directory scan at startup)
+
+        Missing files are added and rows whose file no longer exists are
+        dropped. The table is never cleared wholesale: other workers may index
+        new reports while the scan runs, and their rows must survive it.
+        """
+        reports = list(reports)
+        with self._connect() as conn:
+            added = conn.executemany(
+                "INSERT OR IGNORE INTO reports (id, path, filename, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(r['id'], r['path'], r['filename'], r['size'], r['created_at'].isoformat()) for r in reports]).rowcount
+            stale_ids = [row['id'] for row in conn.execute("SELECT id, path FROM reports")
+                         if not os.path.exists(row['path'])]
+            conn.executemany("DELETE FROM reports WHERE id = ?", [(report_id,) for report_id in stale_ids])
+        logger.info(f"Reports index synchronized with {len(reports)} report file(s): "
+                    f"{max(added, 0)} added, {len(stale_ids)} stale removed")
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict:
+        report = dict(row)
+        report['created_at'] = datetime.fromisoformat(report['created_at'])
+        return report
@@ -1,11 +1,15 @@
 import requests
 import logging
-from typing import Dict, List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 from models import SesameToken, db
 
+logger = logging.getLogger(__name__)
+
 class SesameAPI:
     def __init__(self):
-        self.logger = logging.getLogger(__name__)
+        self.logger = logger
         self.token = None
         self.base_url = None
         self._get_token_and_region()
@@ -105,7 +109,7 @@ class SesameAPI:
                          page: int = 1,
                          limit: int = 300) -> Optional[Dict]:
         """Get work entries (time tracking data)"""
-        params: Dict[str, any] = {"page": page, "limit": limit}
+        params: Dict[str, Any] = {"page": page, "limit": limit}
 
         if employee_id:
             params["employeeId"] = employee_id
@@ -164,6 +168,52 @@ class SesameAPI:
             self.logger.error(f"Error fetching departments: {str(e)}")
             return None
 
+    def get_employees(self,
+                      office_id: Optional[str] = None,
+                      department_id: Optional[str] = None,
+                      page: int = 1,
+                      limit: int = 100) -> Optional[Dict]:
+        """Get employees, filtered server-side by office and/or department"""
+        params: Dict[str, Any] = {"page": page, "limit": limit}
+
+        if office_id:
+            params["officeIds"] = office_id
+        if department_id:
+            params["departmentIds"] = department_id
+
+        return self._make_request("/core/v3/employees", params=params)
+
+    def get_employee_ids(self,
+                         office_id: Optional[str] = None,
+                         department_id: Optional[str] = None,
+                         max_pages: int = 50) -> Optional[set]:
+        """Get the ids of every employee in an office and/or department"""
+        employee_ids = set()
+        page = 1
+
+        while page <= max_pages:
+            response = self.get_employees(office_id=office_id,
+                                          department_id=department_id,
+                                          page=page)
+            if response is None:
+                # Don't return a partial set - the caller would drop valid entries
+                return None
+
+            employee_ids.update(employee.get("id") for employee in response.get("data", []))
+
+            meta = response.get("meta", {})
+            last_page = meta.get("lastPage", 1)
+            if page >= last_page:
+                return employee_ids
+            if page >= max_pages:
+                self.logger.warning(
+                    f"Employees list has {last_page} pages, more than the {max_pages} allowed; "
+                    "not returning a partial set")
+                return None
+            page += 1
+
+        return employee_ids
+
     def get_all_time_tracking_data(self,
                                    employee_id: Optional[str] = None,
                                    company_id: Optional[str] = None,
@@ -249,34 +299,95 @@ class SesameAPI:
                 self.logger.warning("No check type collections found")
                 return mapping
             
-            collections = collections_response["data"]
+            collections = [c for c in collections_response["data"] if c.get("id")]
             self.logger.info(f"Found {len(collections)} check type collections")
             
-            # For each collection, get its check types
+            # Collections whose check types came embedded in the list need no
+            # detail request; the rest are fetched together instead of one by one
+            missing = [c for c in collections if c.get("checkTypes") is None]
+            details = {}
+            if missing:
+                with ThreadPoolExecutor(max_workers=min(8, len(missing))) as executor:
+                    details = dict(zip(
+                        (c["id"] for c in missing),
+                        executor.map(self._get_collection_check_types, (c["id"] for c in missing))))
+            
             for collection in collections:
-                collection_id = collection.get("id")
                 collection_name = collection.get("name", "Sin Grupo")
+                check_types = collection.get("checkTypes")
+                if check_types is None:
+                    check_types = details.get(collection["id"], [])
                 
-                if not collection_id:
-                    continue
-                
-                # Get collection details with check types
-                details_response = self.get_check_type_collection_details(collection_id)
-                if details_response and details_response.get("data"):
-                    # The response is an array with one item
-                    collection_data = details_response["data"][0] if isinstance(details_response["data"], list) else details_response["data"]
-                    check_types = collection_data.get("checkTypes", [])
-                    
-                    # Map each check type ID to the collection name
-                    for check_type in check_types:
-                        check_type_id = check_type.get("id")
-                        if check_type_id:
-                            mapping[check_type_id] = collection_name
-                            self.logger.debug(f"Mapped check type {check_type_id} to collection {collection_name}")
+                # Map each check type ID to the collection name
+                for check_type in check_types:
+                    check_type_id = check_type.get("id")
+                    if check_type_id:
+                        mapping[check_type_id] = collection_name
             
             self.logger.info(f"Created mapping for {len(mapping)} check types")
             return mapping
             
         except Exception as e:
             self.logger.error(f"Error creating check type collections mapping: {str(e)}")
-            return mapping
\ No newline at end of file
+            return mapping
+    
+    def _get_collection_check_types(self, collection_id: str) -> List[Dict]:
+        """Check types of one collection, or an empty list if they can't be fetched"""
+        details_response = self.get_check_type_collection_details(collection_id)
+        if not details_response or not details_response.get("data"):
+            return []
+        # The response is an array with one item
+        collection_data = details_response["data"][0] if isinstance(details_response["data"], list) else details_response["data"]
+        return collection_data.get("checkTypes", [])
+
+
+# Client shared by the request handlers (see get_shared_api)
+_shared_api = None
+_shared_api_lock = threading.Lock()
+
+
+def _stored_token() -> Optional[tuple]:
+    """(token, base_url) SesameAPI would load now, or None if the lookup failed"""
+    try:
+        token_record = db.session.query(SesameToken.token, SesameToken.region).first()
+    except Exception as e:
+        logger.error(f"Error loading token from database: {str(e)}")
+        return None
+    if not token_record:
+        return (None, None)
+    return (token_record.token, f"https://api-{token_record.region}.sesametime.com")
+
+
+def get_shared_api() -> SesameAPI:
+    """Get the shared SesameAPI client, creating it on first use
+
+    Reusing one client keeps its requests.Session (and pooled keep-alive
+    connections) across requests. The stored token is still checked on every
+    call, since another worker process may have applied or removed one, and
+    the client is rebuilt when it changed.
+    """
+    global _shared_api
+    stored = _stored_token()
+    with _shared_api_lock:
+        old_api = _shared_api
+        # Retry the token lookup while no token is configured
+        if (old_api is None or not old_api.token
+                or (stored is not None and stored != (old_api.token, old_api.base_url))):
+            _shared_api = SesameAPI()
+        else:
+            old_api = None
+        api = _shared_api
+    # Release the replaced token's pooled connections instead of waiting for GC
+    if old_api is not None:
+        old_api.session.close()
+    return api
+
+
+def reset_shared_api():
+    """Drop the shared client so the next call loads the current token"""
+    global _shared_api
+    with _shared_api_lock:
+        old_api, _shared_api = _shared_api, None
+    # Release the old token's pooled connections instead of waiting for GC
+    if old_api is not None:
+        old_api.session.close()
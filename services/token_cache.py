@@ -0,0 +1,46 @@
+import hashlib
+from typing import Dict, Optional
+
+from services.ttl_cache import TTLCache
+
+# Token metadata (company, region...) rarely changes, so /core/v3/info responses
+# are reused for a short window instead of paying a round-trip per request
+TOKEN_INFO_TTL_SECONDS = 60
+
+# Offices and departments change even less; reused for a few minutes
+DIRECTORY_TTL_SECONDS = 300
+
+_token_info_cache = TTLCache(TOKEN_INFO_TTL_SECONDS)
+_directory_cache = TTLCache(DIRECTORY_TTL_SECONDS)
+
+
+def token_cache_key(token: str) -> str:
+    """Cache key for a token: its sha256, so caches don't hold raw tokens"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_cached_token_info(api) -> Optional[Dict]:
+    """get_token_info() for the token of the given SesameAPI, reusing recent responses"""
+    if not api.token:
+        return None
+    return _token_info_cache.get_or_fetch(token_cache_key(api.token), api.get_token_info)
+
+
+def get_cached_offices(api) -> Optional[Dict]:
+    """get_offices() for the token of the given SesameAPI, reusing recent responses"""
+    if not api.token:
+        return None
+    return _directory_cache.get_or_fetch(('offices', token_cache_key(api.token)), api.get_offices)
+
+
+def get_cached_departments(api) -> Optional[Dict]:
+    """get_departments() for the token of the given SesameAPI, reusing recent responses"""
+    if not api.token:
+        return None
+    return _directory_cache.get_or_fetch(('departments', token_cache_key(api.token)), api.get_departments)
+
+
+def clear_token_caches():
+    """Forget every cached response (token info, offices and departments)"""
+    _token_info_cache.clear()
+    _directory_cache.clear()
@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Thread-safe in-process cache whose entries expire after ttl_seconds
+
+    get_or_fetch() lets concurrent misses for the same key share a single
+    fetch instead of each calling the upstream API.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            return None
+
+    def set(self, key: Hashable, value: Any):
+        """Cache a value for ttl_seconds"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        """Cached value for key, calling fetch() on a miss
+
+        Only truthy results are cached; failures are retried on the next call.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+
+        with fetch_lock:
+            # Another caller may have fetched it while this one waited
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            value = fetch()
+            if value:
+                self.set(key, value)
+            return value
+
+    def clear(self):
+        """Forget every cached value"""
+        with self._lock:
+            self._entries.clear()
+            self._fetch_locks.clear()
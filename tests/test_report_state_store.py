@@ -0,0 +1,43 @@
+from services.report_state_store import ReportStateStore
+
+FINAL_STATUSES = ('completed', 'error', 'cancelled')
+
+
+def test_active_report_survives_filling_the_store_past_max_reports():
+    store = ReportStateStore(max_reports=4, evictable_statuses=FINAL_STATUSES)
+    store.put('active', {'status': 'starting'})
+
+    for i in range(10):
+        store.put(f'done-{i}', {'status': 'completed'})
+
+    assert store.get('active') == {'status': 'starting'}
+    assert store.update('active', expected_status='starting', status='processing')
+    assert store.update('active', expected_status='processing', status='completed', filename='r.xlsx')
+    assert store.get('active') == {'status': 'completed', 'filename': 'r.xlsx'}
+
+
+def test_active_reports_may_exceed_max_reports_until_they_finish():
+    store = ReportStateStore(max_reports=2, evictable_statuses=FINAL_STATUSES)
+    for i in range(4):
+        store.put(f'job-{i}', {'status': 'processing'})
+
+    assert all(store.get(f'job-{i}') for i in range(4))
+
+    # Finishing keeps the report that just finished; older finished ones go first
+    store.update('job-0', expected_status='processing', status='completed')
+    assert store.get('job-0') == {'status': 'completed'}
+    store.update('job-1', expected_status='processing', status='completed')
+    assert store.get('job-0') is None
+    assert store.get('job-1') == {'status': 'completed'}
+
+
+def test_least_recently_used_finished_reports_are_evicted_first():
+    store = ReportStateStore(max_reports=2, evictable_statuses=FINAL_STATUSES)
+    store.put('a', {'status': 'completed'})
+    store.put('b', {'status': 'completed'})
+    store.get('a')
+    store.put('c', {'status': 'completed'})
+
+    assert store.get('a') is not None
+    assert store.get('b') is None
+    assert store.get('c') is not None